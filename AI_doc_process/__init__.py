@@ -0,0 +1,6 @@
+try:
+    from .celery import app as celery_app
+except ImportError:  # optional; without Celery uploads are processed in-request
+    celery_app = None
+
+__all__ = ("celery_app",)
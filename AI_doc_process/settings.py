@@ -169,6 +169,10 @@ STATICFILES_DIRS = [
 MEDIA_URL = config("MEDIA_URL", default="/media/")
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Stream uploads to a temp file in 64KB chunks rather than holding small ones in memory
+FILE_UPLOAD_HANDLERS = ["django.core.files.uploadhandler.TemporaryFileUploadHandler"]
+FILE_UPLOAD_MAX_MEMORY_SIZE = 0
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -271,11 +275,20 @@ OPENAI_EMBEDDING_MODEL = config(
     "OPENAI_EMBEDDING_MODEL", default="text-embedding-3-large"
 )
 OPENAI_MAX_TOKENS = config("OPENAI_MAX_TOKENS", default=1000, cast=int)
+# Prompt budget for summary/risk-factor input; larger documents are sharded
+OPENAI_MAX_INPUT_TOKENS = config("OPENAI_MAX_INPUT_TOKENS", default=100000, cast=int)
+OPENAI_MAX_CONCURRENCY = config("OPENAI_MAX_CONCURRENCY", default=8, cast=int)
+# Per-job enqueued token cap for the OpenAI Batch API (bulk summaries / risk factors)
+OPENAI_BATCH_MAX_ENQUEUED_TOKENS = config(
+    "OPENAI_BATCH_MAX_ENQUEUED_TOKENS", default=200000, cast=int
+)
 
 # Pinecone Configuration
 PINECONE_API_KEY = config("PINECONE_API_KEY", default="")
 PINECONE_ENVIRONMENT = config("PINECONE_ENVIRONMENT", default="")
 PINECONE_INDEX_NAME = config("PINECONE_INDEX_NAME", default="ai-docs-index-3072")
+# Use the gRPC data-plane client when pinecone[grpc] is installed
+PINECONE_USE_GRPC = config("PINECONE_USE_GRPC", default=True, cast=bool)
 
 # Document Processing Settingse
 MAX_FILE_SIZE_MB = config("MAX_FILE_SIZE_MB", default=10, cast=int)
@@ -288,6 +301,19 @@ LLAMA_CLOUD_API_KEY = config("LLAMA_CLOUD_API_KEY", default="")
 USE_ENHANCED_RAG = config("USE_ENHANCED_RAG", default=False, cast=bool)
 FULL_CONTEXT_CHAR_LIMIT = config("FULL_CONTEXT_CHAR_LIMIT", default=100000, cast=int)  # 100k chars (~25k tokens)
 
+# Background processing: index uploads on Celery workers instead of in the request
+PROCESS_DOCUMENTS_ASYNC = config("PROCESS_DOCUMENTS_ASYNC", default=False, cast=bool)
+CELERY_BROKER_URL = config("CELERY_BROKER_URL", default="redis://localhost:6379/0")
+CELERY_WORKER_CONCURRENCY = config("CELERY_WORKER_CONCURRENCY", default=4, cast=int)
+CELERY_TASK_ACKS_LATE = True
+# Indexing runs on its own queue so embedding workers scale separately:
+#   celery -A AI_doc_process worker -Q embeddings
+CELERY_EMBEDDINGS_QUEUE = config("CELERY_EMBEDDINGS_QUEUE", default="embeddings")
+CELERY_TASK_ROUTES = {
+    "documents.tasks.process_document_task": {"queue": CELERY_EMBEDDINGS_QUEUE},
+}
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
 # Security Settings
 if not DEBUG:
     SECURE_BROWSER_XSS_FILTER = True
@@ -6,6 +6,7 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import logout, authenticate
 from django.core.exceptions import ValidationError
+from django.db.models import Count, Q
 from django.contrib.auth.password_validation import validate_password
 from .models import User, UserProfile
 from .serializers import (
@@ -299,10 +300,15 @@ def admin_only_endpoint(request):
     - length: Number of records per page (default: 10, max: 100)
     - skip: Number of records to skip (optional, overrides page if provided)
     """
-    # Get statistics
-    users_count = User.objects.count()
-    admin_count = User.objects.filter(role="admin").count()
-    user_count = User.objects.filter(role="user").count()
+    # Get statistics (one aggregate query rather than three COUNTs)
+    stats = User.objects.aggregate(
+        users_count=Count("pk"),
+        admin_count=Count("pk", filter=Q(role="admin")),
+        user_count=Count("pk", filter=Q(role="user")),
+    )
+    users_count = stats["users_count"]
+    admin_count = stats["admin_count"]
+    user_count = stats["user_count"]
 
     # Get pagination parameters
     page = int(request.GET.get("page", 1))
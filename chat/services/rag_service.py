@@ -33,7 +33,7 @@ class RAGService:
                 self.pinecone_service = PineconeService(namespace=namespace)
 
             # Generate embedding for the query
-            query_embedding = self.openai_service.generate_embedding(query)
+            query_embedding, _ = self.openai_service.generate_embedding(query)
 
             # Search similar chunks in Pinecone
             similar_chunks = self.pinecone_service.search_similar_chunks(
@@ -1,3 +1,45 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from chat.models import ChatSession
+
+
+@mock.patch("chat.views._retrieve_matches", return_value=[])
+@mock.patch("chat.views.OpenAIService")
+class ChatTopKTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="owner", email="owner@example.com", password="pass"
+        )
+        self.client.force_authenticate(self.user)
+        self.session = ChatSession.objects.create(user=self.user, title="Contracts")
+
+    def ask(self, url, **data):
+        return self.client.post(
+            url, {"session_id": str(self.session.id), "message": "Total sum?", **data},
+            format="json",
+        )
+
+    def requested_top_k(self, retrieve):
+        return retrieve.call_args.args[2]
+
+    def test_top_k_has_a_floor_of_12(self, openai_service, retrieve):
+        openai_service.return_value.count_tokens.return_value = 1
+        openai_service.return_value.generate_answer_by_llm.return_value = ("answer", None)
+        for sent, used in ((3, 12), (0, 12), (20, 20), (500, 500), ("many", 12), (None, 12)):
+            data = {} if sent is None else {"top_k": sent}
+            response = self.ask("/api/chat/message/", **data)
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(self.requested_top_k(retrieve), used)
+            self.assertEqual(response.data["retrieval"]["top_k"], used)
+
+    def test_stream_uses_the_same_top_k_and_reports_retrieval(self, openai_service, retrieve):
+        openai_service.return_value.count_tokens.return_value = 1
+        openai_service.return_value.generate_answer_by_llm_stream.return_value = iter(["a"])
+        response = self.ask("/api/chat/message/stream/", top_k=20)
+        body = b"".join(response.streaming_content).decode()
+        self.assertEqual(self.requested_top_k(retrieve), 20)
+        self.assertIn("event: done", body)
+        self.assertIn('"top_k": 20', body)
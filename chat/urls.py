@@ -6,6 +6,7 @@ from .views import (
     ChatSessionDetailView,
     chat_session_messages,
     ChatView,
+    ChatStreamView,
 )
 
 app_name = "chat"
@@ -34,4 +35,5 @@ urlpatterns = [
     ),
     # path('chat-sessions/create/', create_chat_session, name='create-chat-session'),
     path("message/", ChatView.as_view(), name="chat-message"),
+    path("message/stream/", ChatStreamView.as_view(), name="chat-message-stream"),
 ]
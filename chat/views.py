@@ -1,5 +1,12 @@
+import hashlib
+import json
+import logging
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Window
+from django.http import StreamingHttpResponse
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from .models import ChatSession, ChatMessage
 from rest_framework.decorators import api_view, permission_classes
 from django.shortcuts import get_object_or_404
@@ -15,6 +22,8 @@ from documents.services.openai_service import OpenAIService
 from documents.services.hybrid_rag_service import HybridRAGService, format_full_context_prompt
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
 
 class ChatSessionListView(generics.ListAPIView):
     """
@@ -29,7 +38,6 @@ class ChatSessionListView(generics.ListAPIView):
         base_queryset = ChatSession.objects.filter(
             user=self.request.user, deleted_at__isnull=True
         )
-        sessions_count = base_queryset.count()
 
         # Get pagination parameters
         page = int(self.request.GET.get("page", 1))
@@ -52,10 +60,18 @@ class ChatSessionListView(generics.ListAPIView):
             offset = (page - 1) * length
             current_page = page
 
-        # Get sessions with custom pagination
-        paginated_sessions = base_queryset.order_by("-created_at")[
-            offset : offset + length
-        ]
+        # Get sessions with custom pagination; the total comes back on every row
+        # through COUNT(*) OVER (), so the page and the count are one query
+        paginated_sessions = list(
+            base_queryset.order_by("-created_at").annotate(
+                total_count=Window(expression=Count("pk"))
+            )[offset : offset + length]
+        )
+        if paginated_sessions:
+            sessions_count = paginated_sessions[0].total_count
+        else:
+            # Empty page: nothing to read the total from
+            sessions_count = base_queryset.count() if offset else 0
 
         # Calculate pagination metadata
         total_pages = (sessions_count + length - 1) // length  # Ceiling division
@@ -155,6 +171,260 @@ def chat_session_messages(request, session_id):
 #         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+# Fewest matches retrieved per question, for broader coverage
+MIN_TOP_K = 12
+
+
+def _requested_top_k(request) -> int:
+    """Client's top_k, raised to at least MIN_TOP_K."""
+    try:
+        top_k = int(request.data.get("top_k", MIN_TOP_K))
+    except (TypeError, ValueError):
+        top_k = MIN_TOP_K
+    return max(top_k, MIN_TOP_K)
+
+
+def _get_chat_session(request):
+    """
+    Validate session_id/message and load the user's session. Returns
+    (session, message, None), or (None, None, error_response).
+    """
+    session_id = request.data.get("session_id")
+    message = request.data.get("message", "").strip()
+
+    if not session_id:
+        return None, None, Response(
+            {"error": "session_id is required for chat."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if not message:
+        return None, None, Response(
+            {"error": "Message cannot be empty."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        session = ChatSession.objects.get(id=session_id, user=request.user)
+    except ChatSession.DoesNotExist:
+        return None, None, Response(
+            {
+                "error": "Session not found or you do not have permission to access it."
+            },
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    return session, message, None
+
+
+def _session_history(session):
+    """Last 20 messages of the session, oldest first, as chat completion messages."""
+    history_qs = session.messages.order_by("-created_at")[:20]
+    return [
+        {
+            "role": "user" if msg.message_type == "user" else "assistant",
+            "content": msg.content,
+        }
+        for msg in reversed(history_qs)
+    ]
+
+
+def _session_full_context(session) -> str:
+    """
+    Full text of the session's small documents when enhanced RAG is on, from
+    the hybrid cache or else the database; empty when retrieval is used.
+    """
+    if not getattr(settings, 'USE_ENHANCED_RAG', False):
+        return ""
+
+    # HYBRID RAG: Check if session has full-context documents
+    full_context = HybridRAGService().get_all_session_context(str(session.id))
+
+    # If cache is empty, check database for full_context mode documents
+    if not full_context:
+        full_context_docs = session.documents.filter(
+            processing_mode='full_context',
+            status='completed'
+        ).values_list('full_text', flat=True)
+
+        if full_context_docs:
+            full_context = "\n\n" + "="*80 + "\n\n".join(full_context_docs)
+            logger.debug("[HYBRID RAG] Loaded full context from database (cache was empty)")
+
+    if full_context:
+        logger.info(
+            "[FULL CONTEXT MODE] session=%s context_chars=%d",
+            session.id,
+            len(full_context),
+        )
+    return full_context or ""
+
+
+def _retrieve_matches(session, message, top_k, debug_raw=False):
+    """
+    Run embedding retrieval for a session and return normalized matches
+    """
+    if getattr(settings, 'USE_ENHANCED_RAG', False):
+        # NEW: Use smart retrieval with automatic filtering
+        logger.info("[SMART RETRIEVAL - ENHANCED] session=%s top_k=%d", session.id, top_k)
+
+        pinecone_service = EnhancedPineconeService(
+            namespace=session.namespace,
+            use_semantic_enrichment=True,
+            tenant_id=session.user_id,
+        )
+
+        # Smart retrieval automatically detects query intent and applies filters
+        norm_matches = pinecone_service.smart_retrieval(
+            query=message,
+            top_k=top_k,
+            auto_filter=True
+        )
+
+        logger.info("[SMART RETRIEVAL] Retrieved %d matches", len(norm_matches))
+        if debug_raw and norm_matches and logger.isEnabledFor(logging.DEBUG):
+            for i, m in enumerate(norm_matches[:5]):
+                md = m.get("metadata", {})
+                logger.debug(
+                    "  [%d] score=%.3f types=%s has_amounts=%s section=%s text=%s...",
+                    i + 1,
+                    m.get("score", 0),
+                    md.get("content_types", []),
+                    md.get("has_amounts", False),
+                    md.get("section", "N/A"),
+                    md.get("text", "")[:150],
+                )
+        return norm_matches
+
+    # OLD: Use classic retrieval (backward compatible)
+    logger.info("[RETRIEVAL - CLASSIC] session=%s top_k=%d", session.id, top_k)
+
+    pinecone_embedding = PineconeEmbedding(
+        namespace=session.namespace, tenant_id=session.user_id
+    )
+    search_results = pinecone_embedding.similarity_search(message, top_k=top_k)
+
+    # Normalize matches
+    if isinstance(search_results, dict):
+        matches = search_results.get("matches", [])
+    else:
+        matches = getattr(search_results, "matches", []) or []
+
+    norm_matches = [
+        {
+            "id": getattr(m, "id", None) or m.get("id"),
+            "score": getattr(m, "score", None) or m.get("score"),
+            "metadata": getattr(m, "metadata", None) or m.get("metadata", {}),
+        }
+        for m in matches
+    ]
+    logger.info("[RETRIEVAL] Retrieved %d matches", len(norm_matches))
+    return norm_matches
+
+
+def _match_context(norm_matches):
+    """Context texts for the LLM and per-match diagnostics records."""
+    context_texts = []
+    retrieval = []
+    for m in norm_matches:
+        md = m.get("metadata", {})
+        t = md.get("text")
+        if t:
+            context_texts.append(t)
+        # diagnostics record
+        retrieval.append(
+            {
+                "score": m.get("score"),
+                "document_id": md.get("document_id"),
+                "chunk_index": md.get("chunk_index"),
+                "section_label": md.get("section_label"),
+                "snippet": (t[:200] + "…") if t and len(t) > 200 else t,
+            }
+        )
+    return context_texts, retrieval
+
+
+def _log_unique_texts(norm_matches):
+    """When debug is enabled, log unique texts retrieved (deduped by content hash)"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    seen_hashes = set()
+    unique_prints = []
+    for m in norm_matches:
+        md = m.get("metadata", {}) or {}
+        text_val = md.get("text") or ""
+        if not text_val:
+            continue
+        h = hashlib.sha256(text_val.encode("utf-8")).hexdigest()
+        if h in seen_hashes:
+            continue
+        seen_hashes.add(h)
+        unique_prints.append(
+            {
+                "score": m.get("score"),
+                "document_id": md.get("document_id"),
+                "section_label": md.get("section_label"),
+                "chunk_index": md.get("chunk_index"),
+                "len": len(text_val),
+                "text": text_val,
+            }
+        )
+    logger.debug("[RAG] Unique texts from similarity_search: %d", len(unique_prints))
+    for i, item in enumerate(unique_prints):
+        snippet = item["text"]
+        snippet = (snippet[:800] + "…") if len(snippet) > 800 else snippet
+        logger.debug(
+            "    [%d] score=%s doc=%s section=%s idx=%s len=%d\n      %s",
+            i,
+            item["score"],
+            item["document_id"],
+            item["section_label"],
+            item["chunk_index"],
+            item["len"],
+            snippet,
+        )
+
+
+def _log_context(context_text, context_texts):
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    tail = context_text[-400:] if len(context_text) > 400 else ""
+    logger.debug(
+        "[RAG] Context passed to LLM: total_chars=%d total_chunks=%d\n"
+        "  --- BEGIN CONTEXT HEAD ---\n%s\n  --- END CONTEXT HEAD ---%s",
+        len(context_text),
+        len(context_texts),
+        context_text[:400],
+        f"\n  --- BEGIN CONTEXT TAIL ---\n{tail}\n  --- END CONTEXT TAIL ---"
+        if tail
+        else "",
+    )
+
+
+def _retrieval_payload(session, top_k, full_context, retrieval):
+    return {
+        "namespace": session.namespace,
+        "mode": "full_context" if full_context else "embeddings",
+        "top_k": top_k if not full_context else None,
+        "matches": retrieval,
+        "smart_retrieval_enabled": True,
+    }
+
+
+def _debug_payload(full_context, context_text, norm_matches):
+    # include context text and enhanced metadata
+    if full_context:
+        return {"full_context_length": len(full_context)}
+    return {
+        "similarity_text": context_text or None,
+        "enhanced_metadata": {
+            "total_matches": len(norm_matches),
+            "matches_with_semantic": sum(
+                1 for m in norm_matches if m.get("metadata", {}).get("content_types")
+            ),
+        },
+    }
+
+
 class ChatView(generics.CreateAPIView):
     """
     Endpoint to send a message and receive AI response for a chat session
@@ -164,43 +434,16 @@ class ChatView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def create(self, request, *args, **kwargs):
-        session_id = request.data.get("session_id")
-        message = request.data.get("message", "").strip()
-        user = request.user
-
-        if not session_id:
-            return Response(
-                {"error": "session_id is required for chat."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        if not message:
-            return Response(
-                {"error": "Message cannot be empty."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        try:
-            session = ChatSession.objects.get(id=session_id, user=request.user)
-        except ChatSession.DoesNotExist:
-            return Response(
-                {
-                    "error": "Session not found or you do not have permission to access it."
-                },
-                status=status.HTTP_404_NOT_FOUND,
-            )
+        session, message, error = _get_chat_session(request)
+        if error is not None:
+            return error
 
-        openai_service = OpenAIService()
-
-        try:
-            top_k = int(request.data.get("top_k", 10))
-        except Exception:
-            top_k = 10
-        # Ensure a reasonable minimum for broader coverage
-        if top_k < 12:
-            top_k = 12
+        openai_service = OpenAIService(tenant_id=request.user.id)
+        top_k = _requested_top_k(request)
         debug_raw = str(request.data.get("debug", "false")).lower() == "true"
 
+        history = _session_history(session)
+
         # Proceed with saving the message and generating the AI response
         user_message = ChatMessage.objects.create(
             session=session,
@@ -209,48 +452,19 @@ class ChatView(generics.CreateAPIView):
             token_count=openai_service.count_tokens(message),
         )
 
-        ai_response = "AI response to message..."
-
-        # Check if enhanced RAG is enabled
-        use_enhanced_rag = getattr(settings, 'USE_ENHANCED_RAG', False)
-
+        full_context = ""
+        context_text = ""
+        norm_matches = []
+        retrieval = []
         try:
-            # HYBRID RAG: Check if session has full-context documents
-            hybrid_service = HybridRAGService()
-            full_context = hybrid_service.get_all_session_context(str(session.id))
-
-            # If cache is empty, check database for full_context mode documents
-            if use_enhanced_rag and not full_context:
-                full_context_docs = session.documents.filter(
-                    processing_mode='full_context',
-                    status='completed'
-                ).values_list('full_text', flat=True)
-
-                if full_context_docs:
-                    full_context = "\n\n" + "="*80 + "\n\n".join(full_context_docs)
-                    print("[HYBRID RAG] Loaded full context from database (cache was empty)")
-
-            if use_enhanced_rag and full_context:
+            full_context = _session_full_context(session)
+
+            if full_context:
                 # FULL CONTEXT MODE: Small document(s), send entire text as context
-                print(f"\n{'='*60}")
-                print(f"[FULL CONTEXT MODE] Session: {session.id}")
-                print("  - Using complete document text as context")
-                print(f"  - Context length: {len(full_context):,} chars")
-                print(f"  - Query: {message}")
-                print(f"{'='*60}\n")
-
-                # Format prompt with full context
-                messages = format_full_context_prompt(full_context, message)
-
-                # Get response directly
-                llm_response, openai_response = openai_service.client.chat.completions.create(
+                llm_response = openai_service.create_chat_completion(
                     model=openai_service.model,
-                    messages=messages
-                ), None
-
-                # Extract content
-                if hasattr(llm_response, 'choices'):
-                    llm_response = llm_response.choices[0].message.content.strip()
+                    messages=format_full_context_prompt(full_context, message),
+                ).choices[0].message.content.strip()
 
                 # Create retrieval info for response
                 retrieval = [{
@@ -258,178 +472,41 @@ class ChatView(generics.CreateAPIView):
                     "context_length": len(full_context),
                     "note": "Entire document sent as context (no embedding search needed)"
                 }]
-
-                norm_matches = []  # No matches needed
-
-            elif use_enhanced_rag:
-                # NEW: Use smart retrieval with automatic filtering
-                print(f"\n{'='*60}")
-                print(f"[SMART RETRIEVAL - ENHANCED] Session: {session.id}")
-                print(f"[SMART RETRIEVAL] Query: {message}")
-                print(f"[SMART RETRIEVAL] Top K: {top_k}")
-                print(f"{'='*60}\n")
-
-                pinecone_service = EnhancedPineconeService(
-                    namespace=session.namespace,
-                    use_semantic_enrichment=True
-                )
-
-                # Smart retrieval automatically detects query intent and applies filters
-                norm_matches = pinecone_service.smart_retrieval(
-                    query=message,
-                    top_k=top_k,
-                    auto_filter=True
-                )
-
-                # Print debug info
-                print(f"[SMART RETRIEVAL] Retrieved {len(norm_matches)} matches")
-                if debug_raw and norm_matches:
-                    for i, m in enumerate(norm_matches[:5]):
-                        md = m.get("metadata", {})
-                        print(f"  [{i+1}] Score: {m.get('score', 0):.3f}")
-                        print(f"      Content Types: {md.get('content_types', [])}")
-                        print(f"      Has Amounts: {md.get('has_amounts', False)}")
-                        print(f"      Section: {md.get('section', 'N/A')}")
-                        print(f"      Text: {md.get('text', '')[:150]}...")
-                        print()
             else:
-                # OLD: Use classic retrieval (backward compatible)
-                print(f"\n[RETRIEVAL - CLASSIC] Session: {session.id}, Query: {message}, Top K: {top_k}")
-
-                pinecone_embedding = PineconeEmbedding(namespace=session.namespace)
-                search_results = pinecone_embedding.similarity_search(message, top_k=top_k)
-
-                # Normalize matches
-                matches = []
-                if isinstance(search_results, dict):
-                    matches = search_results.get("matches", [])
-                else:
-                    matches = getattr(search_results, "matches", []) or []
-
-                # Convert to dict format
-                norm_matches = []
-                for m in matches:
-                    norm_matches.append({
-                        "id": getattr(m, "id", None) or m.get("id"),
-                        "score": getattr(m, "score", None) or m.get("score"),
-                        "metadata": getattr(m, "metadata", None) or m.get("metadata", {})
-                    })
-
-                print(f"[RETRIEVAL] Retrieved {len(norm_matches)} matches")
-
-
-            # Build context from matches (only if not using full context mode)
-            if not full_context:
-                context_texts = []
-                if 'retrieval' not in locals():
-                    retrieval = []
-
-                for m in norm_matches:
-                    md = m.get("metadata", {})
-                    t = md.get("text")
-                    if t:
-                        context_texts.append(t)
-                    # diagnostics record
-                    try:
-                        retrieval.append(
-                            {
-                                "score": m.get("score"),
-                                "document_id": md.get("document_id"),
-                                "chunk_index": md.get("chunk_index"),
-                                "section_label": md.get("section_label"),
-                                "snippet": (t[:200] + "…") if t and len(t) > 200 else t,
-                            }
-                        )
-                    except Exception:
-                        pass
-            else:
-                # Full context mode - context already used
-                context_texts = []
-
-            # When debug is enabled, print unique texts retrieved (deduped by content hash)
-            if debug_raw:
-                try:
-                    seen_hashes = set()
-                    unique_prints = []
-                    import hashlib as _hashlib
-                    for m in norm_matches:
-                        md = m.get("metadata", {}) or {}
-                        text_val = md.get("text") or ""
-                        if not text_val:
-                            continue
-                        h = _hashlib.sha256(text_val.encode("utf-8")).hexdigest()
-                        if h in seen_hashes:
-                            continue
-                        seen_hashes.add(h)
-                        unique_prints.append(
-                            {
-                                "score": m.get("score"),
-                                "document_id": md.get("document_id"),
-                                "section_label": md.get("section_label"),
-                                "chunk_index": md.get("chunk_index"),
-                                "len": len(text_val),
-                                "text": text_val,
-                            }
-                        )
-                    print(f"[RAG] Unique texts from similarity_search: {len(unique_prints)}")
-                    for i, item in enumerate(unique_prints):
-                        snippet = item["text"]
-                        snippet = (snippet[:800] + "…") if len(snippet) > 800 else snippet
-                        print(
-                            f"    [{i}] score={item['score']} doc={item['document_id']} section={item['section_label']} idx={item['chunk_index']} len={item['len']}\n      {snippet}"
-                        )
-                except Exception:
-                    pass
-
-            try:
-                print(
-                    f"[RAG] Summary: session={session.id} msg_len={len(message)} unique={len(norm_matches)}"
+                norm_matches = _retrieve_matches(session, message, top_k, debug_raw)
+                context_texts, retrieval = _match_context(norm_matches)
+                if debug_raw:
+                    _log_unique_texts(norm_matches)
+
+                logger.info(
+                    "[RAG] Summary: session=%s msg_len=%d unique=%d",
+                    session.id,
+                    len(message),
+                    len(norm_matches),
                 )
-            except Exception:
-                pass
 
-            history_qs = session.messages.order_by("-created_at")[:20]
-            history = []
-            for msg in reversed(history_qs):  # Oldest first
-                role = "user" if msg.message_type == "user" else "assistant"
-                history.append({"role": role, "content": msg.content})
+                # Add the current user message
+                history.append({"role": "user", "content": message})
 
-            # Add the current user message
-            history.append({"role": "user", "content": message})
-
-            # Generate response using context (skip if already done in full context mode)
-            if not full_context:
                 if context_texts:
                     context_text = "\n".join(context_texts)
                     if debug_raw:
-                        try:
-                            print("[RAG] Context passed to LLM:")
-                            print(f"  total_chars={len(context_text)} total_chunks={len(context_texts)}")
-                            head = context_text[:400]
-                            tail = context_text[-400:] if len(context_text) > 400 else ""
-                            print("  --- BEGIN CONTEXT HEAD ---\n" + head + "\n  --- END CONTEXT HEAD ---")
-                            if tail:
-                                print("  --- BEGIN CONTEXT TAIL ---\n" + tail + "\n  --- END CONTEXT TAIL ---")
-                        except Exception:
-                            pass
-                    llm_response, openai_response = openai_service.generate_answer_by_llm(
+                        _log_context(context_text, context_texts)
+                    llm_response, _ = openai_service.generate_answer_by_llm(
                         similarity_text=context_text, user_query=message, history=history
                     )
                 else:
                     # Log when no relevant context found
-                    try:
-                        print(
-                            f"[RAG] No relevant context found for session={session.id}; sending fallback context."
-                        )
-                    except Exception:
-                        pass
+                    logger.info(
+                        "[RAG] No relevant context found for session=%s; sending fallback context.",
+                        session.id,
+                    )
                     # No relevant context found, generate general response
-                    llm_response, openai_response = openai_service.generate_answer_by_llm(
+                    llm_response, _ = openai_service.generate_answer_by_llm(
                         similarity_text="No relevant document context found.",
                         user_query=message,
                         history=history
                     )
-            # else: llm_response already set in full context mode
 
             # Track chat usage for analytics
             # if openai_response:
@@ -439,10 +516,7 @@ class ChatView(generics.CreateAPIView):
 
         except Exception as e:
             # Fallback response if RAG fails
-            try:
-                print(f"[RAG] ERROR: {e}")
-            except Exception:
-                pass
+            logger.exception("[RAG] ERROR: %s", e)
             llm_response = f"I'm sorry, I encountered an error while processing your request: {str(e)}"
 
         assistant_message = ChatMessage.objects.create(
@@ -456,31 +530,112 @@ class ChatView(generics.CreateAPIView):
             "session_id": session.id,
             "user_message": ChatMessageSerializer(user_message).data,
             "assistant_message": ChatMessageSerializer(assistant_message).data,
-            "retrieval": {
-                "namespace": session.namespace,
-                "mode": "full_context" if full_context else "embeddings",
-                "top_k": top_k if not full_context else None,
-                "matches": retrieval,
-                "smart_retrieval_enabled": True,
-            },
+            "retrieval": _retrieval_payload(session, top_k, full_context, retrieval),
         }
         if debug_raw:
-            # include context text and enhanced metadata
+            resp_payload.update(_debug_payload(full_context, context_text, norm_matches))
+
+        return Response(
+            resp_payload,
+            status=status.HTTP_201_CREATED,
+        )
+
+
+def _sse_event(data, event=None):
+    payload = f"data: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+
+class ChatStreamView(APIView):
+    """
+    Send a message and stream the AI response back as Server-Sent Events.
+    Emits `delta` events with partial text and a final `done` event, which
+    carries the same retrieval (and debug) fields as ChatView's response.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        session, message, error = _get_chat_session(request)
+        if error is not None:
+            return error
+
+        openai_service = OpenAIService(tenant_id=request.user.id)
+        top_k = _requested_top_k(request)
+        debug_raw = str(request.data.get("debug", "false")).lower() == "true"
+
+        history = _session_history(session)
+
+        user_message = ChatMessage.objects.create(
+            session=session,
+            message_type="user",
+            content=message,
+            token_count=openai_service.count_tokens(message),
+        )
+
+        def event_stream():
+            answer_buf = []
+            full_context = ""
+            context_text = ""
+            norm_matches = []
+            retrieval = []
             try:
+                full_context = _session_full_context(session)
+
                 if full_context:
-                    resp_payload["full_context_length"] = len(full_context)
+                    chunks = openai_service.stream_chat_completion(
+                        format_full_context_prompt(full_context, message)
+                    )
+                    retrieval = [{
+                        "mode": "full_context",
+                        "context_length": len(full_context),
+                        "note": "Entire document sent as context (no embedding search needed)"
+                    }]
                 else:
-                    resp_payload["similarity_text"] = context_text if context_texts else None
-            except Exception:
-                resp_payload["similarity_text"] = None
+                    norm_matches = _retrieve_matches(session, message, top_k, debug_raw)
+                    context_texts, retrieval = _match_context(norm_matches)
+                    if debug_raw:
+                        _log_unique_texts(norm_matches)
+                    context_text = "\n".join(context_texts)
+                    if debug_raw and context_text:
+                        _log_context(context_text, context_texts)
+                    chunks = openai_service.generate_answer_by_llm_stream(
+                        similarity_text=context_text
+                        or "No relevant document context found.",
+                        user_query=message,
+                        history=history + [{"role": "user", "content": message}],
+                    )
 
-            if not full_context:
-                resp_payload["enhanced_metadata"] = {
-                    "total_matches": len(norm_matches),
-                    "matches_with_semantic": sum(1 for m in norm_matches if m.get("metadata", {}).get("content_types")),
-                }
+                for delta in chunks:
+                    answer_buf.append(delta)
+                    yield _sse_event({"content": delta}, event="delta")
+            except Exception as e:
+                logger.exception("Error streaming chat response: %s", e)
+                answer_buf = [
+                    f"I'm sorry, I encountered an error while processing your request: {str(e)}"
+                ]
+                yield _sse_event({"error": str(e)}, event="error")
+
+            answer = "".join(answer_buf).strip()
+            assistant_message = ChatMessage.objects.create(
+                session=session,
+                message_type="assistant",
+                content=answer,
+                token_count=openai_service.count_tokens(answer),
+            )
+            done = {
+                "session_id": str(session.id),
+                "user_message": ChatMessageSerializer(user_message).data,
+                "assistant_message": ChatMessageSerializer(assistant_message).data,
+                "retrieval": _retrieval_payload(session, top_k, full_context, retrieval),
+            }
+            if debug_raw:
+                done.update(_debug_payload(full_context, context_text, norm_matches))
+            yield _sse_event(done, event="done")
 
-        return Response(
-            resp_payload,
-            status=status.HTTP_201_CREATED,
+        response = StreamingHttpResponse(
+            event_stream(), content_type="text/event-stream"
         )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+
+from documents.models import Document
+from documents.services.openai_service import (
+    OpenAIService,
+    RiskFactorList,
+    BATCH_KIND_SUMMARY,
+    BATCH_KIND_RISK_FACTORS,
+)
+
+# Terminal states in which a batch will never produce (more) results
+FINISHED_WITHOUT_RESULTS = {"failed", "expired", "cancelled"}
+
+
+class Command(BaseCommand):
+    help = "Poll pending OpenAI Batch API jobs and store their results on documents."
+
+    def handle(self, *args, **options):
+        service = OpenAIService()
+        batch_fields = {
+            BATCH_KIND_SUMMARY: "summary_batch_id",
+            BATCH_KIND_RISK_FACTORS: "risk_factors_batch_id",
+        }
+
+        for kind, field in batch_fields.items():
+            batch_ids = (
+                Document.objects.exclude(**{field: ""})
+                .values_list(field, flat=True)
+                .distinct()
+            )
+            for batch_id in list(batch_ids):
+                status, results = service.retrieve_batch_results(batch_id)
+                pending = Document.objects.filter(**{field: batch_id})
+
+                if results is None:
+                    if status in FINISHED_WITHOUT_RESULTS:
+                        pending.update(**{field: ""})
+                        self.stderr.write(f"Batch {batch_id} {status}; documents released")
+                    else:
+                        self.stdout.write(f"Batch {batch_id} still {status}")
+                    continue
+
+                contents = results.get(kind, {})
+                output_field = (
+                    "summary" if kind == BATCH_KIND_SUMMARY else "risk_factors"
+                )
+                for doc in pending:
+                    content = contents.get(str(doc.id))
+                    setattr(doc, field, "")
+                    if content is None:
+                        # Request failed inside the batch; release for resubmission
+                        doc.save(update_fields=[field, "updated_at"])
+                        continue
+                    if kind == BATCH_KIND_SUMMARY:
+                        doc.summary = content
+                    else:
+                        try:
+                            doc.risk_factors = RiskFactorList.model_validate_json(
+                                content
+                            ).model_dump()
+                        except ValueError:
+                            doc.risk_factors = {"risk_factors": []}
+                    doc.save(update_fields=[output_field, field, "updated_at"])
+                self.stdout.write(
+                    f"Applied {len(contents)} {kind} result(s) from batch {batch_id}"
+                )
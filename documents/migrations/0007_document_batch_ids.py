@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-15 09:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_document_full_text_document_processing_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='risk_factors_batch_id',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='summary_batch_id',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -62,6 +62,10 @@ class Document(models.Model):
     summary = models.TextField(blank=True)
     risk_factors = models.JSONField(default=dict, blank=True)
 
+    # Pending OpenAI Batch API jobs (cleared once results are applied)
+    summary_batch_id = models.CharField(max_length=64, blank=True, db_index=True)
+    risk_factors_batch_id = models.CharField(max_length=64, blank=True, db_index=True)
+
     # Hybrid RAG: Store full text for small documents
     processing_mode = models.CharField(max_length=20, blank=True, default='')
     full_text = models.TextField(blank=True)
@@ -87,6 +91,18 @@ class Document(models.Model):
         indexes = [
             models.Index(fields=["user", "session", "created_at"]),
             models.Index(fields=["status", "created_at"]),
+            # Newest-first listings of live documents, per session and per user;
+            # the upload name check is served by the unique constraint's index
+            models.Index(
+                fields=["session", "-created_at"],
+                condition=Q(deleted_at__isnull=True),
+                name="doc_live_session_created_idx",
+            ),
+            models.Index(
+                fields=["user", "-created_at"],
+                condition=Q(deleted_at__isnull=True),
+                name="doc_live_user_created_idx",
+            ),
         ]
 
     def __str__(self) -> str:
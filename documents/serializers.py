@@ -22,26 +22,38 @@ class DocumentUploadSerializer(serializers.Serializer):
         return attrs
 
     def create(self, validated_data):
+        doc, asset = self.build_instances(validated_data)
+        doc.save()
+        asset.save()
+        return doc
+
+    def build_instances(self, validated_data=None):
+        """
+        Unsaved (Document, FileAsset) pair for the upload, so a batch of uploads
+        can be written with bulk_create
+        """
+        if validated_data is None:
+            validated_data = self.validated_data
         request = self.context["request"]
         user = request.user
         session = self.context.get("session")
         f = validated_data["file"]
 
-        # Compute checksum + collect bytes (for DB storage)
+        # Compute checksum while streaming from the upload's temp file, then read
+        # the bytes once for DB storage (no chunk list alongside the joined copy)
         hasher = hashlib.sha256()
-        chunks = []
         for chunk in f.chunks():
             hasher.update(chunk)
-            chunks.append(chunk)
-        blob = b"".join(chunks)
         checksum = hasher.hexdigest()
+        f.seek(0)
+        blob = f.read()
 
         file_name = f.name
         title = validated_data.get("title") or os.path.splitext(file_name)[0]
         ext = os.path.splitext(file_name)[1].lstrip(".")[:16]
         mime = getattr(f, "content_type", "")
 
-        doc = Document.objects.create(
+        doc = Document(
             title=title,
             file_name=file_name,
             file_ext=ext,
@@ -53,14 +65,14 @@ class DocumentUploadSerializer(serializers.Serializer):
             status=Document.STATUS_PENDING,
         )
 
-        FileAsset.objects.create(
+        asset = FileAsset(
             document=doc,
             blob=blob,
             size=f.size,
             mime_type=mime,
             checksum=checksum,
         )
-        return doc
+        return doc, asset
 
 
 class DocumentListSerializer(serializers.ModelSerializer):
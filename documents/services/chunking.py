@@ -61,7 +61,7 @@ def chunk_text(
                 chunk_text = '\n\n'.join(current_chunk)
                 chunks.append({
                     'text': chunk_text,
-                    'hash': hashlib.sha256(chunk_text.encode('utf-8')).hexdigest(),
+                    'hash': hashlib.blake2b(chunk_text.encode('utf-8'), digest_size=16).hexdigest(),
                     'index': len(chunks),
                     'section': current_section,
                     'tokens': current_tokens,
@@ -79,7 +79,7 @@ def chunk_text(
                 chunk_text = '\n\n'.join(current_chunk)
                 chunks.append({
                     'text': chunk_text,
-                    'hash': hashlib.sha256(chunk_text.encode('utf-8')).hexdigest(),
+                    'hash': hashlib.blake2b(chunk_text.encode('utf-8'), digest_size=16).hexdigest(),
                     'index': len(chunks),
                     'section': current_section,
                     'tokens': current_tokens,
@@ -111,7 +111,7 @@ def chunk_text(
         chunk_text = '\n\n'.join(current_chunk)
         chunks.append({
             'text': chunk_text,
-            'hash': hashlib.sha256(chunk_text.encode('utf-8')).hexdigest(),
+            'hash': hashlib.blake2b(chunk_text.encode('utf-8'), digest_size=16).hexdigest(),
             'index': len(chunks),
             'section': current_section,
             'tokens': current_tokens,
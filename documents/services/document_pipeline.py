@@ -0,0 +1,478 @@
+"""
+Document ingestion pipeline: text extraction followed by either full-context
+storage or chunk embedding into Pinecone.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import List, Union
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from documents.models import Document, FileAsset
+from .document_processor import extract_text_from_bytes, extract_text_from_files
+from .pinecone_service import PineconeService
+from .enhanced_pinecone_service import EnhancedPineconeService
+from .hybrid_rag_service import HybridRAGService
+from .openai_service import OpenAIService
+from .process_pool import in_daemon_process
+
+logger = logging.getLogger(__name__)
+
+# Extracted text is cached by file checksum so summaries and risk factors
+# reuse the text parsed at upload instead of parsing the PDF again
+EXTRACTED_TEXT_CACHE_TIMEOUT = 86400
+
+# Documents of one enhanced-mode upload processed at once; their OpenAI and
+# Pinecone round trips overlap
+ENHANCED_UPLOAD_WORKERS = 4
+
+# PDF parsing is CPU-bound and holds the GIL, so web processes hand it to a
+# long-lived pool of parser processes instead of parsing on the request thread
+TEXT_EXTRACTION_WORKERS = os.cpu_count() or 1
+
+_extraction_pool = None
+_extraction_pool_lock = threading.Lock()
+
+
+def process_document(document: Document, namespace: str):
+    """
+    Extract, chunk and index one uploaded document, tracking progress in its
+    status. Runs in the upload request or in a Celery worker.
+    """
+    if not _start_processing(document):
+        return
+
+    try:
+        changed_fields = _process_file(document, namespace)
+
+        # Outputs of the processing step are written together with the final status
+        document.status = Document.STATUS_COMPLETED
+        document.save(update_fields=["status", *changed_fields, "updated_at"])
+    except Exception as e:
+        _mark_failed(document, e)
+        raise
+
+
+def process_documents(documents: List[Document], namespace: str):
+    """
+    Process the documents of one upload. In classic mode the chunks of all
+    documents are embedded in shared requests and all of their vectors go to
+    Pinecone in one bulk upsert; in enhanced mode documents are processed
+    side by side in threads. A failed document does not stop the others; the
+    first error is re-raised once the rest are stored.
+    """
+    if len(documents) < 2:
+        for document in documents:
+            process_document(document, namespace)
+        return
+    if getattr(settings, 'USE_ENHANCED_RAG', False):
+        _process_concurrently(documents, namespace)
+        return
+
+    # Documents of one upload share a session and so a user
+    engine = PineconeService(namespace=namespace, tenant_id=documents[0].user_id).engine
+    # Status changes shared by the batch are one UPDATE each
+    documents = _claim(documents)
+    # Re-uploads of an already indexed file reuse its vectors
+    copied = [document for document in documents if _copy_from_twin(document, engine)]
+    _set_status(copied, Document.STATUS_COMPLETED)
+    documents = [document for document in documents if document not in copied]
+    items = []
+    ready = []
+    error = None
+    for document, text in zip(documents, _extract_texts(documents)):
+        if isinstance(text, Exception):
+            _mark_failed(document, text)
+            error = error or text
+            continue
+        logger.info(
+            "[Document Processing - CLASSIC] document=%s text_chars=%d",
+            document.file_name,
+            len(text),
+        )
+        _remember_text(document.asset.checksum, False, text)
+        items.append(
+            {"text": text, "file_name": document.file_name, "file_path": f"db://{document.id}"}
+        )
+        ready.append(document)
+
+    # Chunks of all documents share the embeddings requests
+    try:
+        results = engine.embed_documents(items) if items else []
+    except Exception as e:
+        logger.error("[Document Processing Error] %s", e)
+        _set_status(ready, Document.STATUS_FAILED, processing_error=str(e))
+        raise
+
+    prepared = []
+    prepared_docs = []
+    for document, result in zip(ready, results):
+        if isinstance(result, Exception):
+            _mark_failed(document, result)
+            error = error or result
+        else:
+            prepared.append(result)
+            prepared_docs.append(document)
+
+    if prepared:
+        try:
+            engine.bulk_upsert(prepared)
+        except Exception as e:
+            logger.error("[Document Processing Error] %s", e)
+            _set_status(prepared_docs, Document.STATUS_FAILED, processing_error=str(e))
+            raise
+        _set_status(prepared_docs, Document.STATUS_COMPLETED)
+
+    if error is not None:
+        raise error
+
+
+def _copy_from_twin(document: Document, engine) -> bool:
+    """
+    Index a classic-mode document by copying the vectors of a completed upload
+    of the same file (same checksum, same user) instead of extracting and
+    embedding it again. False when there is no such upload or copying fails.
+    """
+    if not document.checksum:
+        return False
+    twin = (
+        Document.objects.filter(
+            checksum=document.checksum,
+            user_id=document.user_id,
+            status=Document.STATUS_COMPLETED,
+            session__isnull=False,
+        )
+        .exclude(pk=document.pk)
+        .order_by("-updated_at")
+        .values_list("pk", "session__namespace")
+        .first()
+    )
+    if twin is None:
+        return False
+    try:
+        copied = engine.copy_document(
+            str(twin[0]),
+            twin[1],
+            document_id=str(document.id),
+            file_name=document.file_name,
+            file_path=f"db://{document.id}",
+        )
+    except Exception as e:
+        logger.warning("[Document Processing] copying vectors of %s failed: %s", twin[0], e)
+        return False
+    if copied:
+        logger.info(
+            "[Document Processing - CLASSIC] document=%s reused %d vectors of %s",
+            document.file_name,
+            copied,
+            twin[0],
+        )
+    return bool(copied)
+
+
+def _process_concurrently(documents: List[Document], namespace: str):
+    workers = min(ENHANCED_UPLOAD_WORKERS, len(documents))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_process_in_thread, d, namespace) for d in documents]
+    errors = [f.exception() for f in futures if f.exception() is not None]
+    if errors:
+        raise errors[0]
+
+
+def _process_in_thread(document: Document, namespace: str):
+    try:
+        process_document(document, namespace)
+    finally:
+        # Each worker thread opened its own database connection
+        connection.close()
+
+
+def generate_summary(document: Document) -> str:
+    """Summarise a completed document with OpenAI and store the summary."""
+    # Use same settings as document upload
+    text = _extracted_text(document, getattr(settings, 'USE_ENHANCED_RAG', False))
+    summary, _ = OpenAIService(tenant_id=document.user_id).generate_summary(text)
+    document.summary = summary or ""
+    document.save(update_fields=["summary", "updated_at"])
+    return document.summary
+
+
+def generate_risk_factors(document: Document) -> dict:
+    """Extract risk factors of a completed document with OpenAI and store them."""
+    text = _extracted_text(document, True)
+    risk_list, _ = OpenAIService(tenant_id=document.user_id).generate_risk_factors(text)
+    document.risk_factors = risk_list.model_dump()
+    document.save(update_fields=["risk_factors", "updated_at"])
+    return document.risk_factors
+
+
+def _text_cache_key(checksum: str, extract_tables: bool) -> str:
+    return f"doctext:{checksum}:{int(extract_tables)}"
+
+
+def _remember_text(checksum: str, extract_tables: bool, text: str):
+    cache.set(
+        _text_cache_key(checksum, extract_tables), text, timeout=EXTRACTED_TEXT_CACHE_TIMEOUT
+    )
+
+
+def _extracted_text(document: Document, extract_tables: bool) -> str:
+    """Text of the stored upload, from the cache when the same file was parsed before."""
+    # The asset (and its blob) is only loaded when the text must be parsed
+    checksum = document.checksum or (
+        FileAsset.objects.filter(document_id=document.pk)
+        .values_list("checksum", flat=True)
+        .first()
+    )
+    text = cache.get(_text_cache_key(checksum, extract_tables)) if checksum else None
+    if text is None:
+        if extract_tables:
+            with _document_file(document) as tmp_path:
+                text, _ = extract_text_from_files([tmp_path], extract_tables=True)
+        else:
+            text = _extract_text(document)
+        if checksum:
+            _remember_text(checksum, extract_tables, text)
+    return text
+
+
+def _extract_texts(documents: List[Document]) -> List[Union[str, Exception]]:
+    """
+    Plain text of each document, or the exception its extraction raised. Text
+    is read from the stored bytes without a temp file, and the files are
+    parsed in parallel in the extraction pool.
+    """
+    results: List[Union[str, Exception]] = []
+    futures = {}
+    for i, document in enumerate(documents):
+        try:
+            futures[i] = _submit_extraction(document.asset.blob, document.file_ext)
+            results.append("")
+        except Exception as e:
+            results.append(e)
+    for i, future in futures.items():
+        try:
+            results[i] = future.result()
+        except Exception as e:
+            results[i] = e
+    return results
+
+
+def _extract_text(document: Document) -> str:
+    """Plain text of a stored upload, parsed in the extraction pool."""
+    return _submit_extraction(document.asset.blob, document.file_ext).result()
+
+
+def _submit_extraction(blob, ext: str) -> Future:
+    """
+    Schedule extract_text_from_bytes in the extraction pool. Celery prefork
+    children are daemonic and cannot start processes; they already parse in
+    parallel with each other, so they parse inline.
+    """
+    if in_daemon_process():
+        future = Future()
+        try:
+            future.set_result(extract_text_from_bytes(blob, ext))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            _extraction_pool = ProcessPoolExecutor(max_workers=TEXT_EXTRACTION_WORKERS)
+        pool = _extraction_pool
+    try:
+        # Drivers may return memoryview, which cannot be pickled to a worker
+        return pool.submit(extract_text_from_bytes, bytes(blob), ext)
+    except BrokenProcessPool:
+        # A parser process died (e.g. OOM on a huge PDF); start a fresh pool
+        with _extraction_pool_lock:
+            if _extraction_pool is pool:
+                _extraction_pool = ProcessPoolExecutor(max_workers=TEXT_EXTRACTION_WORKERS)
+            pool = _extraction_pool
+        return pool.submit(extract_text_from_bytes, bytes(blob), ext)
+
+
+def _start_processing(document: Document) -> bool:
+    """Claim a pending/failed document for processing; False if it is not due."""
+    return bool(_claim([document]))
+
+
+def _claim(documents: List[Document]) -> List[Document]:
+    """
+    Move the pending/failed documents to processing and return them. The
+    status is checked in the UPDATE itself, so a document another worker
+    claimed first is left out instead of being processed twice.
+    """
+    due = (Document.STATUS_PENDING, Document.STATUS_FAILED)
+    candidates = [document for document in documents if document.status in due]
+    if not candidates:
+        return []
+    fields = dict(
+        status=Document.STATUS_PROCESSING, processing_error="", updated_at=timezone.now()
+    )
+    if len(candidates) == 1:
+        updated = Document.objects.filter(pk=candidates[0].pk, status__in=due).update(**fields)
+        claimed_pks = {candidates[0].pk} if updated else set()
+    else:
+        with transaction.atomic():
+            claimed_pks = set(
+                Document.objects.select_for_update(skip_locked=True)
+                .filter(pk__in=[document.pk for document in candidates], status__in=due)
+                .values_list("pk", flat=True)
+            )
+            Document.objects.filter(pk__in=claimed_pks).update(**fields)
+    claimed = [document for document in candidates if document.pk in claimed_pks]
+    for document in claimed:
+        for name, value in fields.items():
+            setattr(document, name, value)
+    return claimed
+
+
+def _set_status(documents: List[Document], status: str, **fields):
+    """
+    Give several documents the same status in one UPDATE and mirror it on the
+    instances. update() skips auto_now, so updated_at is set here.
+    """
+    if not documents:
+        return
+    fields.update(status=status, updated_at=timezone.now())
+    Document.objects.filter(pk__in=[document.pk for document in documents]).update(**fields)
+    for document in documents:
+        for name, value in fields.items():
+            setattr(document, name, value)
+
+
+def _mark_failed(document: Document, error: Exception):
+    logger.error("[Document Processing Error] %s", error)
+    document.status = Document.STATUS_FAILED
+    document.processing_error = str(error)
+    document.save(update_fields=["status", "processing_error", "updated_at"])
+
+
+@contextmanager
+def _document_file(document: Document):
+    """
+    Write the stored upload to a temp file for the extractors; the file goes
+    away with its temp directory when the block exits.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        name = f"upload.{document.file_ext}" if document.file_ext else "upload"
+        tmp_path = os.path.join(tmp_dir, name)
+        with open(tmp_path, "wb") as tmp:
+            tmp.write(document.asset.blob)
+        yield tmp_path
+
+
+def _process_file(document: Document, namespace: str) -> List[str]:
+    """
+    Extract and index an uploaded file according to the RAG mode. Fields set on
+    the document are returned for the caller to save, not saved here.
+    """
+    changed_fields: List[str] = []
+
+    # Check if we should use enhanced RAG
+    use_enhanced_rag = getattr(settings, 'USE_ENHANCED_RAG', False)
+
+    if use_enhanced_rag:
+        # Extract text with tables; the table extractor reads the PDF by path
+        with _document_file(document) as tmp_path:
+            text_with_tables, table_metadata = extract_text_from_files(
+                [tmp_path],
+                extract_tables=True
+            )
+        _remember_text(document.asset.checksum, True, text_with_tables)
+
+        # Initialize hybrid RAG service
+        hybrid_service = HybridRAGService()
+        mode_info = hybrid_service.get_processing_mode(text_with_tables)
+
+        logger.info(
+            "[HYBRID RAG - %s] document=%s text_chars=%d tokens~%d tables=%d reason=%s",
+            mode_info['mode'].upper(),
+            document.file_name,
+            len(text_with_tables),
+            mode_info['estimated_tokens'],
+            table_metadata.get('table_count', 0),
+            mode_info['reason'],
+        )
+
+        if mode_info['mode'] == 'full_context':
+            # SMALL DOCUMENT: Store full text in DATABASE (persistent across restarts)
+
+            # Stored in the database for persistence when the document completes
+            document.processing_mode = 'full_context'
+            document.full_text = text_with_tables
+            changed_fields = ['processing_mode', 'full_text']
+
+            # Also store in cache for fast retrieval (optional performance boost)
+            hybrid_service.store_full_context(
+                session_id=str(document.session.id),
+                document_id=str(document.id),
+                text=text_with_tables,
+                metadata=table_metadata
+            )
+
+        else:
+            # LARGE DOCUMENT: Use embeddings as usual
+
+            # Mark processing mode
+            document.processing_mode = 'embeddings'
+            changed_fields = ['processing_mode']
+
+            # Use enhanced Pinecone service with semantic enrichment
+            service = EnhancedPineconeService(
+                namespace=namespace,
+                use_semantic_enrichment=True,
+                tenant_id=document.user_id,
+            )
+
+            result = service.store_text_with_semantics(
+                document_id=str(document.id),
+                text=text_with_tables,
+                file_name=document.file_name,
+                file_path=f"db://{document.id}",
+                use_llm_enrichment=False
+            )
+
+            logger.info(
+                "[HYBRID RAG] document=%s chunks=%d upserted=%d semantic_enrichment=%s",
+                document.file_name,
+                result.get('chunks_processed', 0),
+                result.get('upserted', 0),
+                result.get('semantic_enrichment', False),
+            )
+
+    else:
+        # OLD: Use original system (backward compatible)
+        engine = PineconeService(namespace=namespace, tenant_id=document.user_id).engine
+        if _copy_from_twin(document, engine):
+            return changed_fields
+
+        text = _extract_text(document)
+        _remember_text(document.asset.checksum, False, text)
+
+        logger.info(
+            "[Document Processing - CLASSIC] document=%s text_chars=%d",
+            document.file_name,
+            len(text),
+        )
+
+        engine.main(
+            text=text,
+            file_name=document.file_name,
+            file_path=f"db://{document.id}",
+            user=document.user,
+        )
+
+    return changed_fields
@@ -1,21 +1,39 @@
-from typing import Optional, Tuple
+from functools import lru_cache
+from typing import List, Optional, Tuple, Union
 from django.conf import settings
+import io
+import logging
 import os
 import re
+import tempfile
+
+try:
+    import pymupdf  # type: ignore
+except Exception:  # optional; PDF text falls back to pdfplumber
+    pymupdf = None
 
 try:
     import pdfplumber  # type: ignore
 except Exception:
     pdfplumber = None
 
+logger = logging.getLogger(__name__)
+
 # from llama_index.core import SimpleDirectoryReader
-from llama_parse import LlamaParse
 
-from dotenv import load_dotenv
 
+@lru_cache(maxsize=None)
+def _get_llama_parser(result_type: str):
+    """
+    LlamaParse client, created on first use. Importing llama_parse and reading .env
+    are deferred so they are not paid at Django startup by every worker.
+    """
+    from dotenv import load_dotenv
+    from llama_parse import LlamaParse
 
-# Load environment variables
-load_dotenv()
+    # LlamaParse reads LLAMA_CLOUD_API_KEY from the environment
+    load_dotenv()
+    return LlamaParse(result_type=result_type, auto_mode=True)
 
 
 def _clean_text(text: str) -> str:
@@ -75,6 +93,35 @@ def _clean_text(text: str) -> str:
     return "\n".join(cleaned_lines).strip()
 
 
+def _pdf_page_texts(source: Union[str, bytes, memoryview]) -> List[str]:
+    """
+    Non-empty text of each page of a PDF path or in-memory PDF. Scanned PDFs
+    have no text layer and come back empty, which sends them to LlamaParse.
+    """
+    text_blocks = []
+    in_memory = not isinstance(source, str)
+    if pymupdf is not None:
+        pdf = pymupdf.open(stream=source, filetype="pdf") if in_memory else pymupdf.open(source)
+        with pdf:
+            for page in pdf:
+                # sort=True reads blocks top-to-bottom, left-to-right like layout mode
+                page_text = page.get_text("text", sort=True)
+                if page_text.strip():
+                    text_blocks.append(page_text)
+        return text_blocks
+
+    with pdfplumber.open(io.BytesIO(source) if in_memory else source) as pdf:
+        for page_num, page in enumerate(pdf.pages, 1):
+            # Extract with layout to preserve positioning
+            page_text = page.extract_text(layout=True) or ""
+
+            if page_text:
+                # Add page marker for debugging (optional)
+                # text_blocks.append(f"\n--- Page {page_num} ---\n")
+                text_blocks.append(page_text)
+    return text_blocks
+
+
 def extract_text_from_files(file_paths, result_type="text", extract_tables=True):
     """
     Extract text with BETTER structure preservation for legal/financial docs.
@@ -94,21 +141,14 @@ def extract_text_from_files(file_paths, result_type="text", extract_tables=True)
     file_path = file_paths[0]
     _, ext = os.path.splitext(file_path.lower())
 
-    # For PDFs, use pdfplumber with layout=True for better structure
-    if ext == ".pdf" and pdfplumber is not None:
+    # For PDFs, use PyMuPDF (C-backed, much faster) when installed, else
+    # pdfplumber with layout=True for better structure
+    if ext == ".pdf" and (pymupdf is not None or pdfplumber is not None):
         text_blocks = []
         try:
-            with pdfplumber.open(file_path) as pdf:
-                for page_num, page in enumerate(pdf.pages, 1):
-                    # Extract with layout to preserve positioning
-                    page_text = page.extract_text(layout=True) or ""
-
-                    if page_text:
-                        # Add page marker for debugging (optional)
-                        # text_blocks.append(f"\n--- Page {page_num} ---\n")
-                        text_blocks.append(page_text)
-        except Exception as e:
-            print(f"pdfplumber failed: {e}, falling back to LlamaParse")
+            text_blocks = _pdf_page_texts(file_path)
+        except Exception:
+            logger.warning("PDF text extraction failed, falling back to LlamaParse", exc_info=True)
             text_blocks = []
 
         if text_blocks:
@@ -121,24 +161,51 @@ def extract_text_from_files(file_paths, result_type="text", extract_tables=True)
                     from documents.services.table_extractor import extract_and_merge_tables_with_text
                     merged_text, table_metadata = extract_and_merge_tables_with_text(file_path, cleaned_text)
                     return merged_text, table_metadata
-                except Exception as e:
-                    print(f"Table extraction failed: {e}")
+                except Exception:
+                    logger.warning("Table extraction failed", exc_info=True)
                     return cleaned_text, {'has_tables': False}
             else:
                 return cleaned_text  # Return just text if extract_tables=False
 
     # Fallback: LlamaParse
-    parser = LlamaParse(result_type=result_type, auto_mode=True)
-    result = parser.parse(file_path)
-    text_documents = result.get_text_documents(split_by_page=False)
-    text = "\n\n".join([doc.text for doc in text_documents])
-    cleaned_text = _clean_text(text)
+    cleaned_text = _llama_parse_text(file_path, result_type)
 
     if extract_tables:
         return cleaned_text, {'has_tables': False}
     return cleaned_text
 
 
+def extract_text_from_bytes(data: Union[bytes, memoryview], ext: str, result_type="text") -> str:
+    """
+    Plain text (no table merge) of an upload held in memory, such as a FileAsset
+    blob. PDFs with a text layer are parsed straight from memory; only scanned
+    PDFs and other formats are written to a temp file for LlamaParse.
+    """
+    ext = ext.lower().lstrip(".")
+    if ext == "pdf" and (pymupdf is not None or pdfplumber is not None):
+        try:
+            text_blocks = _pdf_page_texts(data)
+        except Exception:
+            logger.warning("PDF text extraction failed, falling back to LlamaParse", exc_info=True)
+            text_blocks = []
+        if text_blocks:
+            return _clean_text("\n\n".join(text_blocks))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # LlamaParse picks the parser from the file extension
+        tmp_path = os.path.join(tmp_dir, f"upload.{ext}" if ext else "upload")
+        with open(tmp_path, "wb") as tmp:
+            tmp.write(data)
+        return _llama_parse_text(tmp_path, result_type)
+
+
+def _llama_parse_text(file_path: str, result_type: str) -> str:
+    parser = _get_llama_parser(result_type)
+    result = parser.parse(file_path)
+    text_documents = result.get_text_documents(split_by_page=False)
+    return _clean_text("\n\n".join([doc.text for doc in text_documents]))
+
+
 class DocumentProcessor:
     """
     Service class for processing documents and extracting text.
@@ -11,6 +11,9 @@ from documents.services.chunking import chunk_text
 from documents.services.semantic_processor import SemanticProcessor, enhance_chunks_for_rag
 from django.conf import settings
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class EnhancedPineconeService(PineconeService):
@@ -18,8 +21,13 @@ class EnhancedPineconeService(PineconeService):
     Enhanced Pinecone service with semantic metadata support
     """
 
-    def __init__(self, namespace: Optional[str] = None, use_semantic_enrichment: bool = True):
-        super().__init__(namespace=namespace)
+    def __init__(
+        self,
+        namespace: Optional[str] = None,
+        use_semantic_enrichment: bool = True,
+        tenant_id: Any = None,
+    ):
+        super().__init__(namespace=namespace, tenant_id=tenant_id)
         self.use_semantic_enrichment = use_semantic_enrichment
         self.semantic_processor = SemanticProcessor(use_llm_extraction=False)  # Start with regex-based
 
@@ -49,16 +57,23 @@ class EnhancedPineconeService(PineconeService):
         max_tokens = getattr(settings, "CHUNK_SIZE", 1000)
         overlap_tokens = getattr(settings, "CHUNK_OVERLAP", 200)
 
-        print(f"[Enhanced Pinecone] Chunking text...")
-        print(f"  - Text length: {len(text)} chars")
-        print(f"  - Max tokens: {max_tokens}, Overlap: {overlap_tokens}")
+        logger.info(
+            "[Enhanced Pinecone] chunking text_chars=%d max_tokens=%d overlap=%d",
+            len(text),
+            max_tokens,
+            overlap_tokens,
+        )
 
         base_chunks = chunk_text(text, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
 
-        print(f"  - Created {len(base_chunks)} base chunks")
-        if base_chunks:
-            for i, chunk in enumerate(base_chunks[:3]):
-                print(f"    Chunk {i}: {chunk.get('tokens', 0)} tokens, section: {chunk.get('section', 'N/A')}")
+        logger.info("[Enhanced Pinecone] created %d base chunks", len(base_chunks))
+        for i, chunk in enumerate(base_chunks[:3]):
+            logger.debug(
+                "[Enhanced Pinecone] chunk %d: %s tokens, section: %s",
+                i,
+                chunk.get('tokens', 0),
+                chunk.get('section', 'N/A'),
+            )
 
         if not base_chunks:
             return {"upserted": 0, "document_id": document_id, "namespace": self.namespace}
@@ -1,386 +1,706 @@
+import io
+import asyncio
+import json
+import functools
+import hashlib
+import os
+import numpy as np
+import jinja2
 import openai
 import logging
 import tiktoken
-from typing import List, Tuple, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Tuple, Dict, Any, Iterable, Iterator, Optional
 from django.conf import settings
+from pydantic import BaseModel, ConfigDict
+from tenacity import (
+    before_sleep_log,
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
 
 logger = logging.getLogger(__name__)
 
+try:
+    import h2  # noqa: F401  (lets httpx negotiate HTTP/2)
+
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+# Batch API job kinds -> message builder used for each request line
+BATCH_KIND_SUMMARY = "summary"
+BATCH_KIND_RISK_FACTORS = "risk_factors"
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Per-request limits of the embeddings endpoint
+EMBEDDING_MAX_INPUTS = 2048
+EMBEDDING_MAX_TOKENS = 300000
+
+# Prompt templates live in documents/prompts and are compiled once at import.
+# Static system prompts are rendered once; user prompts are rendered per call.
+_PROMPTS = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(Path(__file__).resolve().parent.parent / "prompts"),
+    autoescape=False,
+    undefined=jinja2.StrictUndefined,
+    keep_trailing_newline=True,
+)
+
+_SUMMARY_SYSTEM_PROMPT = _PROMPTS.get_template("summary.system.j2").render()
+_SUMMARY_USER_TEMPLATE = _PROMPTS.get_template("summary.user.j2")
+
+_LEGAL_SYSTEM_PROMPT = _PROMPTS.get_template("legal_answer.system.j2").render()
+# Only the retrieved context and question vary per call; they come last so
+# the system prompt stays a cacheable prompt prefix.
+_LEGAL_USER_TEMPLATE = _PROMPTS.get_template("legal_answer.user.j2")
+
+_RISK_SYSTEM_PROMPT = _PROMPTS.get_template("risk_factors.system.j2").render()
+_RISK_USER_TEMPLATE = _PROMPTS.get_template("risk_factors.user.j2")
+
+
+class RiskFactor(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    risk_factor: str
+    description: str
+    reference: str
+
+
+class RiskFactorList(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    risk_factors: List[RiskFactor]
+
+
+RISK_FACTORS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "risks",
+        "schema": RiskFactorList.model_json_schema(),
+        "strict": True,
+    },
+}
+
+# Extra request body fields per Batch API job kind
+_BATCH_BODY_OPTIONS = {
+    BATCH_KIND_RISK_FACTORS: {"response_format": RISK_FACTORS_RESPONSE_FORMAT},
+}
+
+# 4xx responses worth retrying; every other 4xx is a caller error
+_RETRYABLE_STATUS_CODES = {408, 409, 429}
+_backoff = wait_random_exponential(min=1, max=60)
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    # APITimeoutError is a subclass of APIConnectionError
+    if isinstance(exc, openai.APIConnectionError):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in _RETRYABLE_STATUS_CODES or exc.status_code >= 500
+    return False
+
+
+def _retry_after_or_backoff(retry_state) -> float:
+    """
+    Honor the server's Retry-After header, else jittered exponential backoff
+    """
+    response = getattr(retry_state.outcome.exception(), "response", None)
+    if response is not None:
+        try:
+            return min(float(response.headers.get("retry-after")), 60.0)
+        except (TypeError, ValueError):
+            pass
+    return _backoff(retry_state)
+
+
+_openai_retry = retry(
+    retry=retry_if_exception(_is_retryable),
+    wait=_retry_after_or_backoff,
+    stop=stop_after_attempt(6),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True,
+)
+
+
+@functools.lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """
+    Load the tiktoken encoding for a model once per process
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@dataclass(frozen=True)
+class UsageStats:
+    """
+    Token usage of one or more API calls, parsed once from response.usage
+    """
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    cached_tokens: int = 0
+
+    @classmethod
+    def from_response(cls, response) -> "UsageStats":
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return cls()
+        details = getattr(usage, "prompt_tokens_details", None)
+        return cls(
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+            total_tokens=getattr(usage, "total_tokens", 0) or 0,
+            cached_tokens=getattr(details, "cached_tokens", 0) or 0,
+        )
+
+    def __add__(self, other: "UsageStats") -> "UsageStats":
+        return UsageStats(
+            prompt_tokens=self.prompt_tokens + other.prompt_tokens,
+            completion_tokens=self.completion_tokens + other.completion_tokens,
+            total_tokens=self.total_tokens + other.total_tokens,
+            cached_tokens=self.cached_tokens + other.cached_tokens,
+        )
+
+
+def hash_tenant(tenant_id) -> str:
+    """Opaque per-tenant tag sent as the API `user` field."""
+    return hashlib.sha256(str(tenant_id).encode()).hexdigest()[:16]
+
+
+@functools.lru_cache(maxsize=None)
+def get_openai_client() -> openai.OpenAI:
+    """
+    Process-wide OpenAI client so the HTTP connection pool is reused across requests.
+    Retries are handled by _openai_retry, not the SDK. Connections are multiplexed
+    over HTTP/2 when the h2 package is installed.
+    """
+    return openai.OpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        max_retries=0,
+        http_client=openai.DefaultHttpxClient(http2=_HTTP2),
+    )
+
+
+def make_async_openai_client() -> openai.AsyncOpenAI:
+    """
+    AsyncOpenAI client configured like get_openai_client (no SDK retries,
+    HTTP/2). Its transport is tied to the event loop it first runs on, so it
+    is created per loop rather than shared process-wide.
+    """
+    return openai.AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        max_retries=0,
+        http_client=openai.DefaultAsyncHttpxClient(http2=_HTTP2),
+    )
+
 
 class OpenAIService:
     """
     Service class for OpenAI API interactions
     """
 
-    def __init__(self):
-        openai.api_key = settings.OPENAI_API_KEY
+    def __init__(self, tenant_id=None):
         self.model = settings.OPENAI_MODEL
         self.embedding_model = settings.OPENAI_EMBEDDING_MODEL
         self.max_tokens = settings.OPENAI_MAX_TOKENS
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = get_openai_client()
+        # Sent as the API `user` field so OpenAI can attribute traffic per tenant
+        self.user_tag = hash_tenant(tenant_id) if tenant_id is not None else None
+
+    @functools.cached_property
+    def async_client(self) -> openai.AsyncOpenAI:
+        return make_async_openai_client()
+
+    def _with_user(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        if self.user_tag:
+            kwargs.setdefault("user", self.user_tag)
+        return kwargs
 
-    def generate_embedding(self, text: str) -> Tuple[List[float], Any]:
+    @_openai_retry
+    def create_chat_completion(self, **kwargs):
+        """chat.completions.create with the tenant tag and _openai_retry backoff"""
+        return self.client.chat.completions.create(**self._with_user(kwargs))
+
+    @_openai_retry
+    def _create_embeddings(self, **kwargs):
+        return self.client.embeddings.create(**self._with_user(kwargs))
+
+    def generate_embedding(self, text: str) -> Tuple[np.ndarray, UsageStats]:
         """
         Generate embedding for text using OpenAI
-        Returns: (embedding_vector, full_response_object)
+        Returns: (float32 embedding_vector, usage)
         """
         try:
-            response = self.client.embeddings.create(
+            response = self._create_embeddings(
                 model=self.embedding_model, input=text
             )
-            embedding = response.data[0].embedding
-            return embedding, response
+            embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
+            return embedding, UsageStats.from_response(response)
         except Exception as e:
             logger.error(f"Error generating embedding: {str(e)}")
             raise Exception(f"Failed to generate embedding: {str(e)}")
 
     def generate_embeddings_batch(
         self, texts: List[str]
-    ) -> Tuple[List[List[float]], Any]:
+    ) -> Tuple[np.ndarray, UsageStats]:
         """
-        Generate embeddings for multiple texts
-        Returns: (embedding_vectors, full_response_object)
+        Generate embeddings for multiple texts.
+        Identical texts are embedded once and scattered back to every
+        position. Inputs are split into requests that stay under the
+        embeddings endpoint's per-request input and token limits.
+        Returns: ((N, D) float32 embedding matrix, usage summed over requests)
         """
         try:
-            response = self.client.embeddings.create(
-                model=self.embedding_model, input=texts
-            )
-            embeddings = [data.embedding for data in response.data]
-            return embeddings, response
+            # Order-preserving de-duplication: text -> row in the unique matrix
+            positions: Dict[str, int] = {}
+            inverse = [positions.setdefault(text, len(positions)) for text in texts]
+            unique = list(positions)
+
+            embeddings: List[np.ndarray] = []
+            usage = UsageStats()
+            for start, end in self._embedding_batches(unique):
+                response = self._create_embeddings(
+                    model=self.embedding_model, input=unique[start:end]
+                )
+                embeddings.append(
+                    np.asarray(
+                        [data.embedding for data in response.data], dtype=np.float32
+                    )
+                )
+                usage += UsageStats.from_response(response)
+            if not embeddings:
+                return np.empty((0, 0), dtype=np.float32), usage
+            return np.vstack(embeddings)[inverse], usage
         except Exception as e:
             logger.error(f"Error generating batch embeddings: {str(e)}")
             raise Exception(f"Failed to generate batch embeddings: {str(e)}")
 
-    def generate_summary(self, text: str) -> Tuple[str, Any]:
+    def _embedding_batches(self, texts: List[str]) -> List[Tuple[int, int]]:
         """
-        Generate summary of text using OpenAI
-        Returns: (summary_text, full_response_object)
+        Split texts into (start, end) slices under EMBEDDING_MAX_INPUTS and
+        EMBEDDING_MAX_TOKENS per request
         """
-        try:
-            # System prompt to instruct the model on how to generate Markdown summaries
-            system_prompt = """
-                You are a professional document summarizer. Your job is to read the user-provided document and produce a concise Markdown summary.
-
-                Core rules:
-                - Keep the summary **very short**: one or two paragraphs maximum.
-                - Write in clear, simple, confident, and professional language.
-                - Do NOT include tables, headings, or long detail.
-                - Do NOT add, infer, or hallucinate anything not present in the document.
-                - The summary should be enough for a new reader to immediately understand what the document is about without reading the full content.
-
-                Markdown formatting requirements:
-                - Output plain paragraphs only (no headings, no tables).
-                - Use **bold** sparingly for emphasis on important terms, if necessary.
-                - The text must be valid Markdown but remain minimal and clean.
-
-                Output constraints:
-                - Return **only** the Markdown summary (no extra explanations, no commentary).
-            """
-
-            # User prompt with explicit Markdown output requirements
-            user_prompt = f"""
-                # User Prompt
-
-                You will receive the full content of a document below. Please:
-                - Read and understand the content thoroughly.
-                - Identify the main idea, purpose, and key points.
-                - Create an accurate, **short** summary (1–2 paragraphs maximum).
-                - Do not use headings, subheadings, or tables.
-                - Keep the summary simple, clear, and professional.
-                - Do not hallucinate or add information not in the document.
-                - Return only the Markdown summary.
-
-                # Document Content
-                {text}
-
-                # Generate the summary now (1–2 paragraphs, Markdown only)
-            """
+        batches = []
+        start, tokens = 0, 0
+        for i, n in enumerate(self.count_tokens_batch(texts, self.embedding_model)):
+            if i > start and (
+                i - start >= EMBEDDING_MAX_INPUTS or tokens + n > EMBEDDING_MAX_TOKENS
+            ):
+                batches.append((start, i))
+                start, tokens = i, 0
+            tokens += n
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    def _build_summary_messages(self, text: str) -> List[Dict[str, str]]:
+        """
+        Build the chat messages used to summarize a document
+        """
+        return [
+            {"role": "developer", "content": _SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": _SUMMARY_USER_TEMPLATE.render(text=text)},
+        ]
+
+    def generate_summary(self, text: str) -> Tuple[str, UsageStats]:
+        """
+        Generate summary of text using OpenAI.
+        Documents over the input token budget are summarized map-reduce style:
+        each shard is summarized in parallel, then the partial summaries are
+        summarized again.
+        Returns: (summary_text, usage summed over every call made)
+        """
+        budget = self._input_token_budget()
+        if self.count_tokens(text, self.model) <= budget:
+            return self._summarize(text)
+
+        shards = self._shard_text(text, budget)
+        logger.info(f"Summarizing oversized document in {len(shards)} shards")
+        partials = self._map_shards(self._summarize, shards)
+        summary, usage = self.generate_summary("\n\n".join(p for p, _ in partials))
+        return summary, sum((u for _, u in partials), usage)
 
+    def _summarize(self, text: str) -> Tuple[str, UsageStats]:
+        try:
             # Requesting the completion from the model
-            response = self.client.chat.completions.create(
+            response = self.create_chat_completion(
                 model=self.model,
-                messages=[
-                    {"role": "developer", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
+                messages=self._build_summary_messages(text),
             )
 
             # Extracting the summary from the model's response
             summary = response.choices[0].message.content.strip()
-            return summary, response
+            return summary, UsageStats.from_response(response)
 
         except Exception as e:
             logger.error(f"Error generating summary: {str(e)}")
             raise Exception(f"Failed to generate summary: {str(e)}")
 
-    def generate_answer_by_llm(self, similarity_text: str, user_query: str, history: list = None):
+    def _build_answer_messages(
+        self, similarity_text: str, user_query: str, history: list = None
+    ) -> List[Dict[str, str]]:
+        """
+        Build the chat messages used to answer a question over retrieved context
+        """
+        user_prompt = _LEGAL_USER_TEMPLATE.render(
+            similarity_text=similarity_text, user_query=user_query
+        )
+
+        messages = [{"role": "developer", "content": _LEGAL_SYSTEM_PROMPT}]
+        if history:
+            messages.extend(history)
+        messages.append({"role": "user", "content": user_prompt})
+        return messages
+
+    def generate_answer_by_llm(
+        self, similarity_text: str, user_query: str, history: list = None
+    ) -> Tuple[str, UsageStats]:
         """
         Generate an answer using LLM with context, adapting format based on question type.
-        Returns: (answer_text, full_response_object)
+        Returns: (answer_text, usage)
         """
         try:
-            user_prompt = f"""
-                You are an expert AI legal counsel assistant. Your job is to ANSWER THE USER'S ACTUAL QUESTION through both explicit text analysis and intelligent interpretation of implicit meanings.
-
-                **Core Principle:**
-                Legal and contractual questions require INTERPRETATION at multiple levels:
-                - Explicit: What is directly stated
-                - Implicit: What is logically implied or follows from stated terms
-                - Structural: What the document's organization and relationships reveal
-                - Contextual: What standard practices and legal principles suggest
-
-                **Context:**
-                {similarity_text}
-
-                **Question:**
-                {user_query}
-
-                **How to Answer:**
-
-                1. **Understand what the user is really asking**
-                   - "What documents overrule others?" → They want the precedence hierarchy
-                   - "Who is liable for X?" → They want to know responsibility allocation
-                   - "When does Y happen?" → They want the trigger/timeline/condition
-                   - "Can we do Z?" → They want to know rights and limitations
-
-                2. **Search for answers at multiple levels:**
-
-                   **Level 1 - Explicit Information:**
-                   - Direct statements and clearly defined terms
-                   - Specific clauses that address the question
-
-                   **Level 2 - Implicit Information:**
-                   - Logical implications from stated terms (e.g., if X must happen before Y, then Y cannot happen until X is complete)
-                   - Negative space reasoning (e.g., if only Party A can terminate, implicitly Party B cannot)
-                   - Definitional implications (e.g., "exclusive rights" implies others are excluded)
-                   - Conditional relationships (e.g., if payment triggers obligation, non-payment implies no obligation)
-                   - Cross-referencing between clauses that together answer the question
-
-                   **Level 3 - Structural Information:**
-                   - Document hierarchy and section relationships
-                   - Amendment and override structures
-                   - Definitions that cascade through the document
-                   - Precedence established by "notwithstanding" or "subject to" clauses
-
-                   **Level 4 - Contextual Information:**
-                   - Standard legal interpretation principles (specificity, hierarchy, context)
-                   - Industry-standard practices and norms
-                   - Typical contractual frameworks
-                   - Legal doctrines (e.g., contra proferentem, good faith)
-
-                3. **Interpretation Methodology:**
-
-                   **When information is implicit:**
-                   - Identify the relevant clauses that, when read together, answer the question
-                   - Explain the logical chain: "Clause A states X, which combined with Clause B stating Y, means Z"
-                   - Note: "⚠️ This interpretation is based on [specific clauses/logical implication/document structure]"
-
-                   **Examples of implicit reasoning:**
-                   - Q: "Can Party B assign this contract?" 
-                     A: "Section 5.3 states 'Party A may assign with written consent.' Since only Party A's assignment rights are mentioned and contracts typically require mutual consent for assignment, Party B likely cannot assign without explicit permission. ⚠️ Based on standard interpretation that enumeration of one party's rights suggests limitation of the other's."
-
-                   - Q: "What happens if payment is 60 days late?"
-                     A: "Section 4.2 states late fees apply after 30 days, and Section 4.5 allows termination for 'material breach.' While not explicitly stated, 60-day late payment would likely constitute material breach given the 30-day threshold for lesser penalties. ⚠️ Based on the escalation structure implied by these provisions."
-
-                4. **Structure your response:**
-
-                   **For explicit answers:**
-                   - State the answer clearly
-                   - Cite specific clause(s)
-                   - Provide direct quotations when helpful
-
-                   **For implicit answers:**
-                   - State the interpreted answer clearly
-                   - Explain the reasoning path step-by-step
-                   - Reference the clauses/structure that support the interpretation
-                   - Add interpretive disclaimer: "⚠️ This is based on [reasoning type] as it's not explicitly stated"
-
-                   **For questions requiring both:**
-                   - Start with explicit information
-                   - Layer on implicit interpretations
-                   - Clearly distinguish between what's stated vs. implied
-
-                5. **ONLY say "Information not found" if:**
-                   - The question asks for a specific fact (date, amount, name, address) that is neither stated nor derivable
-                   - No explicit text, implicit meaning, structural relationship, or reasonable interpretation can answer it
-                   - The question requires information genuinely outside the document's scope
-                   - You cannot make any defensible inference even using standard legal principles
-
-                **Response Format:**
-
-                **Explicit Information Available:**
-                "[Direct answer] — Per Section X.Y: '[relevant quote]'"
-
-                **Implicit Information (requires interpretation):**
-                "[Interpreted answer] — Based on:
-                • Section X.Y states: [clause 1]
-                • Section A.B states: [clause 2]
-                • Together, these imply: [reasoning]
-                ⚠️ This interpretation is based on [logical implication/document structure/standard practice]"
-
-                **Mixed (explicit + implicit):**
-                "[Answer] — Section X explicitly states [explicit part]. While [implicit aspect] isn't directly stated, it can be reasonably inferred from [reasoning]. ⚠️ The latter part is interpretive."
-
-                **Types of interpretive reasoning to apply:**
-                - **Inclusio unius est exclusio alterius**: Mentioning one thing excludes others
-                - **Noscitur a sociis**: Words are known by their companions (context)
-                - **Ejusdem generis**: General terms limited by specific preceding terms
-                - **Expressio unius est exclusio alterius**: Expressing one excludes others
-                - **Logical necessity**: If A requires B, then not-B means not-A
-                - **Structural precedence**: Later/specific provisions override earlier/general ones
-                - **Cross-referential synthesis**: Combining multiple clauses to derive meaning
-
-                **Remember:** 
-                - Users need actionable guidance on what documents MEAN, not just what they SAY
-                - Many questions are answerable through interpretation even when not explicitly addressed
-                - Be transparent about when you're interpreting vs. citing
-                - Use your analytical capabilities fully—you're a legal analyst, not just a search engine
-                - Good legal analysis often requires reading between the lines while being clear about doing so
-                """
-
-            messages = []
-            if history:
-                messages.extend(history)
-            messages.append({"role": "user", "content": user_prompt})
-
-            response = self.client.chat.completions.create(
+            response = self.create_chat_completion(
                 model=self.model,
-                messages=messages,
+                messages=self._build_answer_messages(similarity_text, user_query, history),
                 temperature=0.7,
             )
 
+            usage = UsageStats.from_response(response)
+            logger.debug(
+                f"LLM answer prompt tokens: {usage.prompt_tokens}, "
+                f"cached: {usage.cached_tokens}"
+            )
+
             answer = response.choices[0].message.content.strip()
-            return answer, response
+            return answer, usage
 
         except Exception as e:
             logger.error(f"Error generating LLM answer: {str(e)}")
             raise Exception(f"Failed to generate LLM answer: {str(e)}")
 
-    def generate_risk_factors(self, text: str):
+    def generate_answer_by_llm_stream(
+        self, similarity_text: str, user_query: str, history: list = None
+    ) -> Iterator[str]:
         """
-        Generate answer using LLM with context
-        Returns: (answer_text, full_response_object)
+        Streaming variant of generate_answer_by_llm.
+        Yields the answer text as content deltas arrive from the model.
         """
-        try:
-            system_prompt = """
-                #System Prompt
-
-                You are a professional risk auditor specialized in reviewing documents for sensitive or confidential content. Your role is to scan the provided document carefully and extract any information that poses a **risk**, such as personal data, financial information, or confidential business details.
-
-                Your responsibilities:
-
-                * Identify actual risk factors **present in the document**. Do **not** invent or assume anything that is not explicitly stated.
-                * For each risk, return a JSON object with:
+        yield from self.stream_chat_completion(
+            self._build_answer_messages(similarity_text, user_query, history),
+            temperature=0.7,
+        )
 
-                * `risk_factor`: The category of risk (e.g., Personal Information, Financial Information).
-                * `description`: A short explanation of why this is risky or sensitive.
-                * `reference`: The exact phrase or sentence from the document where this risk appears.
-
-                Strict Output Rules:
-
-                * Return a single, valid **JSON object** with a key `"risk_factors"` that holds an array of all detected risk items.
-                * **No explanations, comments, headings, or non-JSON output. Only return the JSON.**
-                * If no risk factors are found, return:
-                {
-                    "risk_factors": []
-                }
-
-                Style and Conduct:
-
-                * **Professional, accurate, and non-speculative.**
-                * **Never hallucinate** — only analyze and report what is **directly stated** in the document.
-                * Ensure output is **clean, well-formatted**, and suitable for integration into automated systems.
-                """
-
-            user_prompt = f"""
-                #User Prompt
-
-                I’m going to provide you with a piece of text or a document. I want you to:
-
-                1. Carefully read the content and identify any **potential risk factors** — anything sensitive, confidential, or inappropriate to share (e.g., personal data, financial info, contact details, internal company matters).
-                2. For each issue, provide:
-
-                * The category of risk (`risk_factor`)
-                * A brief reason why it’s considered risky (`description`)
-                * The **exact reference** or quote from the document where this occurs (`reference`)
-
-                **Output Format:**
-
-                Return a valid JSON object, using this structure:
-
-                {{
-                "risk_factors": [
-                    {{
-                    "risk_factor": "Type of Risk",
-                    "description": "Why it's risky.",
-                    "reference": "Exact example from the text."
-                    }}
-                ]
-                }}
-
-                3. If there are **no risks**, return:
-
-                {{
-                "risk_factors": []
-                }}
-
-                **Important Instructions:**
-
-                * **Do NOT hallucinate**. Only report risks that are actually present in the text.
-                * **Do NOT summarize or explain anything outside the JSON.**
-                * Keep the tone **professional and accurate**.
-                * The output must be **only the JSON**, no extra text before or after.
+    def _build_risk_factor_messages(self, text: str) -> List[Dict[str, str]]:
+        """
+        Build the chat messages used to extract risk factors from a document
+        """
+        return [
+            {"role": "developer", "content": _RISK_SYSTEM_PROMPT},
+            {"role": "user", "content": _RISK_USER_TEMPLATE.render(text=text)},
+        ]
 
-                #Document Content
-                {text}
+    def generate_risk_factors(self, text: str) -> Tuple[RiskFactorList, UsageStats]:
+        """
+        Extract risk factors using a strict JSON schema response format.
+        Documents over the input token budget are split into shards that are
+        analysed in parallel; their risk factors are merged and de-duplicated.
+        Returns: (RiskFactorList, usage summed over every call made)
+        """
+        budget = self._input_token_budget()
+        if self.count_tokens(text, self.model) <= budget:
+            return self._extract_risk_factors(text)
 
-                # Generate Risk Factors in JSON format
-                """
+        shards = self._shard_text(text, budget)
+        logger.info(f"Extracting risk factors from oversized document in {len(shards)} shards")
+        results = self._map_shards(self._extract_risk_factors, shards)
+        return self._merge_risk_factors(results)
 
-            response = self.client.chat.completions.create(
+    def _extract_risk_factors(self, text: str) -> Tuple[RiskFactorList, UsageStats]:
+        try:
+            response = self.create_chat_completion(
                 model=self.model,
-                messages=[
-                    {"role": "developer", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
+                messages=self._build_risk_factor_messages(text),
+                response_format=RISK_FACTORS_RESPONSE_FORMAT,
             )
 
-            risk_factors = response.choices[0].message.content.strip()
-            print("risk_factors", risk_factors)
-            return risk_factors, response
+            content = response.choices[0].message.content
+            return RiskFactorList.model_validate_json(content), UsageStats.from_response(
+                response
+            )
         except Exception as e:
-            # logger.error(f"Error generating risk factors: {str(e)}")
+            logger.error("Error generating risk factors: %s", e)
             raise Exception(f"Failed to generate risk factors: {str(e)}")
 
+    # ---------- Oversized document handling ----------
+
+    def _input_token_budget(self) -> int:
+        return int(settings.OPENAI_MAX_INPUT_TOKENS * 0.6)
+
+    def _shard_text(self, text: str, budget: int) -> List[str]:
+        """
+        Split text on paragraph boundaries into shards of at most ~budget tokens
+        """
+        paragraphs = [p for p in text.split("\n\n") if p.strip()]
+        shards: List[str] = []
+        current: List[str] = []
+        current_tokens = 0
+        for para, tokens in zip(paragraphs, self.count_tokens_batch(paragraphs, self.model)):
+            if current and current_tokens + tokens > budget:
+                shards.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            if tokens > budget:
+                # A single oversized paragraph is cut by characters (~4 per token)
+                step = budget * 4
+                shards.extend(para[i : i + step] for i in range(0, len(para), step))
+                continue
+            current.append(para)
+            current_tokens += tokens
+        if current:
+            shards.append("\n\n".join(current))
+        return shards
+
+    def _merge_risk_factors(
+        self, results: List[Tuple[RiskFactorList, UsageStats]]
+    ) -> Tuple[RiskFactorList, UsageStats]:
+        """
+        Merge per-shard risk factors, dropping repeats of the same reference
+        """
+        seen = set()
+        merged = []
+        for risk_list, _ in results:
+            for item in risk_list.risk_factors:
+                key = (item.risk_factor, item.reference)
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(item)
+        return RiskFactorList(risk_factors=merged), sum(
+            (usage for _, usage in results), UsageStats()
+        )
+
+    def _map_shards(self, fn, shards: List[str]) -> List[Any]:
+        """
+        Run fn over shards on a bounded thread pool, preserving shard order
+        """
+        workers = max(1, min(settings.OPENAI_MAX_CONCURRENCY, len(shards)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(fn, shards))
+
     def count_tokens(self, text: str, model: str = "gpt-3.5-turbo") -> int:
         """
         Count tokens in text for the embedding model
         """
+        if not text:
+            return 0
         try:
-            encoding = tiktoken.encoding_for_model(model)
-            return len(encoding.encode(text))
+            return len(_get_encoding(model).encode(text))
         except Exception as e:
             logger.warning(f"Error counting tokens: {str(e)}")
             # Fallback: rough estimation (1 token ≈ 4 characters)
             return len(text) // 4
 
-    def chat_completion(self, messages: List[Dict[str, str]]) -> Tuple[str, Any]:
+    def count_tokens_batch(
+        self, texts: List[str], model: str = "gpt-3.5-turbo"
+    ) -> List[int]:
+        """
+        Count tokens for many texts at once.
+        tiktoken encodes the batch on native threads, outside the GIL.
+        """
+        try:
+            encoded = _get_encoding(model).encode_ordinary_batch(
+                texts, num_threads=os.cpu_count() or 1
+            )
+            return [len(tokens) for tokens in encoded]
+        except Exception as e:
+            logger.warning(f"Error counting tokens: {str(e)}")
+            return [len(text) // 4 for text in texts]
+
+    def chat_completion(self, messages: List[Dict[str, str]]) -> Tuple[str, UsageStats]:
         """
         Generate chat completion with optional context
-        Returns: (response_text, full_response_object)
+        Returns: (response_text, usage)
         """
         try:
             system_message = "You are a helpful assistant that answers questions based on provided documents."
 
             chat_messages = [{"role": "system", "content": system_message}] + messages
 
-            response = self.client.chat.completions.create(
+            response = self.create_chat_completion(
                 model=self.model,
                 messages=chat_messages,
             )
 
             content = response.choices[0].message.content.strip()
-            return content, response
+            return content, UsageStats.from_response(response)
         except Exception as e:
             logger.error(f"Error in chat completion: {str(e)}")
             raise Exception(f"Failed to generate chat completion: {str(e)}")
+
+    def stream_chat_completion(
+        self, messages: List[Dict[str, str]], **kwargs
+    ) -> Iterator[str]:
+        """
+        Stream a chat completion, yielding content deltas as they arrive
+        """
+        try:
+            response = self.create_chat_completion(
+                model=self.model, messages=messages, stream=True, **kwargs
+            )
+
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        except Exception as e:
+            logger.error(f"Error in streaming chat completion: {str(e)}")
+            raise Exception(f"Failed to stream chat completion: {str(e)}")
+
+    # ---------- Async transport (concurrent chunk enrichment) ----------
+
+    @_openai_retry
+    async def acreate_chat_completion(self, **kwargs):
+        """Async create_chat_completion on this service's async client"""
+        return await self.async_client.chat.completions.create(**self._with_user(kwargs))
+
+    async def gather_bounded(self, fn, items: List[Any]) -> List[Any]:
+        """
+        Await fn over items with at most OPENAI_MAX_CONCURRENCY in flight,
+        returning the results in item order
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.OPENAI_MAX_CONCURRENCY))
+
+        async def run(item):
+            async with semaphore:
+                return await fn(item)
+
+        return await asyncio.gather(*(run(item) for item in items))
+
+    # ---------- Batch API (non-interactive bulk jobs) ----------
+
+    def _batch_messages(self, kind: str, text: str) -> List[Dict[str, str]]:
+        if kind == BATCH_KIND_SUMMARY:
+            return self._build_summary_messages(text)
+        if kind == BATCH_KIND_RISK_FACTORS:
+            return self._build_risk_factor_messages(text)
+        raise ValueError(f"Unsupported batch kind: {kind}")
+
+    def submit_batch(
+        self, kind: str, documents: Iterable[Tuple[str, str]]
+    ) -> Dict[str, List[str]]:
+        """
+        Submit (document_id, text) pairs to the OpenAI Batch API.
+
+        Requests are split across several batch jobs so that no single job
+        exceeds OPENAI_BATCH_MAX_ENQUEUED_TOKENS.
+        Returns: {batch_id: [document_id, ...]} for every submitted job
+        """
+        max_tokens = getattr(settings, "OPENAI_BATCH_MAX_ENQUEUED_TOKENS", 200000)
+
+        jobs: List[Tuple[List[str], List[str]]] = []
+        lines: List[str] = []
+        document_ids: List[str] = []
+        enqueued = 0
+        requests = [
+            (document_id, self._batch_messages(kind, text))
+            for document_id, text in documents
+        ]
+        request_tokens = self.count_tokens_batch(
+            ["".join(m["content"] for m in messages) for _, messages in requests]
+        )
+        for (document_id, messages), tokens in zip(requests, request_tokens):
+            if lines and enqueued + tokens > max_tokens:
+                jobs.append((lines, document_ids))
+                lines, document_ids, enqueued = [], [], 0
+            lines.append(
+                json.dumps(
+                    {
+                        "custom_id": f"{kind}:{document_id}",
+                        "method": "POST",
+                        "url": BATCH_ENDPOINT,
+                        "body": {
+                            "model": self.model,
+                            "messages": messages,
+                            **_BATCH_BODY_OPTIONS.get(kind, {}),
+                        },
+                    }
+                )
+            )
+            document_ids.append(str(document_id))
+            enqueued += tokens
+        if lines:
+            jobs.append((lines, document_ids))
+
+        submitted: Dict[str, List[str]] = {}
+        for job_lines, job_document_ids in jobs:
+            try:
+                payload = io.BytesIO(("\n".join(job_lines) + "\n").encode("utf-8"))
+                input_file = self.client.files.create(
+                    file=(f"{kind}_batch.jsonl", payload), purpose="batch"
+                )
+                batch = self.client.batches.create(
+                    input_file_id=input_file.id,
+                    endpoint=BATCH_ENDPOINT,
+                    completion_window="24h",
+                    metadata={"kind": kind},
+                )
+            except Exception as e:
+                logger.error(f"Error submitting {kind} batch: {str(e)}")
+                raise Exception(f"Failed to submit {kind} batch: {str(e)}")
+            submitted[batch.id] = job_document_ids
+        return submitted
+
+    def submit_summary_batch(
+        self, documents: Iterable[Tuple[str, str]]
+    ) -> Dict[str, List[str]]:
+        return self.submit_batch(BATCH_KIND_SUMMARY, documents)
+
+    def submit_risk_factors_batch(
+        self, documents: Iterable[Tuple[str, str]]
+    ) -> Dict[str, List[str]]:
+        return self.submit_batch(BATCH_KIND_RISK_FACTORS, documents)
+
+    def retrieve_batch_results(
+        self, batch_id: str
+    ) -> Tuple[str, Optional[Dict[str, Dict[str, str]]]]:
+        """
+        Poll a batch job and reassemble its results once it has finished.
+        Returns: (batch_status, results) where results maps
+                 kind -> {document_id: content} and is None until the job completes
+        """
+        try:
+            batch = self.client.batches.retrieve(batch_id)
+        except Exception as e:
+            logger.error(f"Error retrieving batch {batch_id}: {str(e)}")
+            raise Exception(f"Failed to retrieve batch {batch_id}: {str(e)}")
+
+        if batch.status != "completed":
+            return batch.status, None
+
+        results: Dict[str, Dict[str, str]] = {}
+        if batch.output_file_id:
+            output = self.client.files.content(batch.output_file_id).text
+            for line in output.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                kind, _, document_id = record["custom_id"].partition(":")
+                response = record.get("response") or {}
+                if record.get("error") or response.get("status_code") != 200:
+                    logger.warning(
+                        f"Batch {batch_id} request {record['custom_id']} failed: "
+                        f"{record.get('error') or response.get('status_code')}"
+                    )
+                    continue
+                content = response["body"]["choices"][0]["message"]["content"] or ""
+                results.setdefault(kind, {})[document_id] = content.strip()
+        return batch.status, results
@@ -1,14 +1,42 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields
 from datetime import datetime
+from functools import lru_cache
+import asyncio
+import functools
 import hashlib
+import itertools
 import re
+import threading
+import time
+
+import numpy as np
 
 from django.conf import settings
 from pinecone import Pinecone, ServerlessSpec
-from openai import OpenAI
+from openai import AsyncOpenAI
 from pinecone.openapi_support.exceptions import NotFoundException
 
+from documents.services.openai_service import (
+    _openai_retry,
+    get_openai_client,
+    hash_tenant,
+    make_async_openai_client,
+)
+from documents.services.process_pool import pool_workers
+
+try:
+    from pinecone.grpc import PineconeGRPC
+except ImportError:  # pinecone[grpc] extra not installed; use the REST client
+    PineconeGRPC = None
+
+try:
+    import hyperscan
+except ImportError:  # optional; the financial tag falls back to _FIN_RE
+    hyperscan = None
+
 try:
     from documents.services.chunking import chunk_text
 except Exception:
@@ -19,14 +47,185 @@ except Exception:
         overlap_tokens: int = 120,
         token_model: str = "cl100k_base",
     ):
+        # Strip each paragraph once; str.split on the normalised text is a single C pass
         paras = [
-            p.strip() for p in text.replace("\r\n", "\n").split("\n\n") if p.strip()
+            p for p in map(str.strip, text.replace("\r\n", "\n").split("\n\n")) if p
         ]
-        chunks = []
-        for i, p in enumerate(paras):
-            h = hashlib.sha256(p.encode("utf-8")).hexdigest()
-            chunks.append({"text": p, "hash": h, "index": i})
-        return chunks
+        return [
+            {
+                "text": p,
+                "hash": hashlib.blake2b(p.encode("utf-8"), digest_size=16).hexdigest(),
+                "index": i,
+            }
+            for i, p in enumerate(paras)
+        ]
+
+# Section heading at the start of a chunk, e.g. "6.0 RETENTION"
+_SECTION_RE = re.compile(r"\b(\d+(?:\.\d+)*)\s+([A-Z][A-Za-z\s]{2,})\b")
+# Financial phrases used to tag chunks for filtering/boosting
+_FIN_RE = re.compile(r"£[\d,]+|contractor shall pay|subcontract sum", re.IGNORECASE)
+
+# Ids per fetch / delete-by-id request when diffing a re-ingested document
+FETCH_BATCH = 100
+DELETE_BATCH = 1000
+
+# How long describe_index_stats results are reused within one PineconeEmbedding
+STATS_TTL_SECONDS = 30
+
+# Max embedding requests in flight per document; keeps bursts under OpenAI RPM limits
+EMBED_CONCURRENCY = 8
+
+# Pinecone upsert limits: 1000 vectors or 2MB of request body, whichever comes first
+UPSERT_MAX_VECTORS = 1000
+UPSERT_MAX_BYTES = 2 * 1024 * 1024
+# Conservative size of one float serialized in the JSON request body
+# (float32 values widen to up to ~24 repr characters, e.g. "-0.010000000149011612")
+_JSON_BYTES_PER_FLOAT = 24
+# gRPC sends values as packed protobuf float32
+_GRPC_BYTES_PER_FLOAT = 4
+# Concurrent upsert requests on the REST index handle (its pool_threads)
+UPSERT_WORKERS = 8
+
+# Documents with more chunks than this have their tags scanned in a process pool;
+# below it the pool's startup cost outweighs the regex work
+TAG_PROCESS_THRESHOLD = 2000
+TAG_PROCESS_CHUNKSIZE = 200
+
+
+def _upsert_batches(
+    vectors: List[Dict[str, Any]], bytes_per_float: int = _JSON_BYTES_PER_FLOAT
+):
+    """Yield slices of vectors that stay under both Pinecone upsert limits."""
+    batch: List[Dict[str, Any]] = []
+    size = 0
+    for v in vectors:
+        v_size = len(v["values"]) * bytes_per_float + len(
+            str(v.get("metadata") or "")
+        )
+        if batch and (
+            len(batch) >= UPSERT_MAX_VECTORS or size + v_size > UPSERT_MAX_BYTES
+        ):
+            yield batch
+            batch, size = [], 0
+        batch.append(v)
+        size += v_size
+    if batch:
+        yield batch
+
+
+def _vector_id(document_id: Optional[str], c: Dict[str, Any]) -> str:
+    # Deterministic vector ID for idempotency
+    return f"{document_id or 'noid'}:{c['index']}:{c['hash'][:8]}"
+
+
+@dataclass(slots=True)
+class ChunkMeta:
+    """Per-chunk Pinecone metadata; turned into a dict only when the vector is sent."""
+
+    document_id: Optional[str]
+    file_name: Optional[str]
+    file_path: Optional[str]
+    chunk_index: int
+    chunk_hash: str
+    text: str
+    embedding_model: str
+    timestamp: str
+    section_label: Optional[str] = None
+    contains_financial_info: Optional[bool] = None
+
+    def to_metadata(self) -> Dict[str, Any]:
+        # Build metadata without nulls (Pinecone rejects null values)
+        return {
+            name: value
+            for name in _CHUNK_META_FIELDS
+            if (value := getattr(self, name)) is not None
+        }
+
+
+_CHUNK_META_FIELDS = tuple(f.name for f in fields(ChunkMeta))
+
+
+def _vector_dict(
+    c: Dict[str, Any],
+    vec,
+    shared: Dict[str, Any],
+    document_id: Optional[str],
+    truncate_metadata_text_to: Optional[int],
+) -> Dict[str, Any]:
+    # Slicing a str that is already short enough returns it without copying
+    meta_text = c["text"]
+    if truncate_metadata_text_to:
+        meta_text = meta_text[:truncate_metadata_text_to]
+
+    # Tags may have been precomputed for the whole document (see _scan_chunks)
+    section_label, contains_financial = c.get("tags") or _scan_chunk(meta_text)
+    metadata = ChunkMeta(
+        **shared,
+        chunk_index=c["index"],
+        chunk_hash=c["hash"],
+        text=meta_text,
+        section_label=section_label,
+        # Financial tagging to help filtering/boosting
+        contains_financial_info=True if contains_financial else None,
+    )
+    return {
+        "id": _vector_id(document_id, c),
+        "values": vec,
+        "metadata": metadata,
+    }
+
+
+def _wire_vector(vector: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a vector's float32 values to the list form the Pinecone client sends."""
+    metadata = vector.get("metadata")
+    if isinstance(metadata, ChunkMeta):
+        metadata = metadata.to_metadata()
+    wired = {**vector, "values": np.asarray(vector["values"], dtype=np.float32).tolist()}
+    if metadata is not None:
+        wired["metadata"] = metadata
+    return wired
+
+
+def _user_kwargs(user: Optional[str]) -> Dict[str, str]:
+    # Tenant tag for the API `user` field, when the caller knows the tenant
+    return {"user": user} if user else {}
+
+
+@lru_cache(maxsize=1024)
+@_openai_retry
+def _cached_embed(model: str, text: str, user: Optional[str] = None) -> tuple:
+    """Query embeddings, memoised per process; returned as a tuple so it stays immutable."""
+    resp = get_openai_client().embeddings.create(
+        model=model, input=[text], **_user_kwargs(user)
+    )
+    return tuple(resp.data[0].embedding)
+
+
+@lru_cache(maxsize=4)
+def _get_pinecone(api_key: str) -> Pinecone:
+    """Process-wide REST control-plane client (index create/describe)."""
+    return Pinecone(api_key=api_key)
+
+
+# index name -> dimension, for indexes already checked/created by this process
+_checked_indexes: Dict[str, int] = {}
+
+
+def _use_grpc() -> bool:
+    return PineconeGRPC is not None and getattr(settings, "PINECONE_USE_GRPC", True)
+
+
+@lru_cache(maxsize=4)
+def _get_index(api_key: str, index_name: str, grpc: bool = False):
+    """
+    One Index handle per index for the whole process. Creating a handle resolves
+    the index host over the network, so it is done once and shared; both the REST
+    and the gRPC handle are safe to use from multiple threads.
+    """
+    if grpc:
+        return PineconeGRPC(api_key=api_key).Index(index_name)
+    # The REST handle runs async_req upserts on its own thread pool
+    return _get_pinecone(api_key).Index(index_name, pool_threads=UPSERT_WORKERS)
 
 
 def _model_for_dim(dim: int) -> str:
@@ -44,8 +243,8 @@ def _infer_section_label(text: str) -> Optional[str]:
     at the beginning of the chunk. Helps retrieval ranking and UX display.
     """
     try:
-        head = (text or "").strip().split("\n", 1)[0][:120]
-        m = re.search(r"\b(\d+(?:\.\d+)*)\s+([A-Z][A-Za-z\s]{2,})\b", head)
+        head = (text or "").lstrip()[:121].split("\n", 1)[0][:120]
+        m = _SECTION_RE.search(head)
         if m:
             return f"{m.group(1)} {m.group(2).strip()}"
     except Exception:
@@ -53,6 +252,55 @@ def _infer_section_label(text: str) -> Optional[str]:
     return None
 
 
+@lru_cache(maxsize=1)
+def _financial_db():
+    """Hyperscan database for _FIN_RE (case-insensitive, stop at first match)."""
+    db = hyperscan.Database()
+    db.compile(
+        expressions=[_FIN_RE.pattern.encode("utf-8")],
+        ids=[0],
+        elements=1,
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH],
+    )
+    return db
+
+
+def _contains_financial(text: str) -> bool:
+    if hyperscan is None:
+        return _FIN_RE.search(text) is not None
+    hits = []
+
+    def on_match(_id, _start, _end, _flags, _ctx):
+        hits.append(_id)
+        return True  # stop scanning
+
+    _financial_db().scan(text.encode("utf-8"), match_event_handler=on_match)
+    return bool(hits)
+
+
+def _scan_chunk(text: str) -> Tuple[Optional[str], bool]:
+    """
+    Tag a chunk in one pass: (section_label, contains_financial_info).
+
+    The section pattern is case-sensitive and only looks at the first line, while the
+    financial pattern is case-insensitive over the whole chunk, so they stay separate
+    scans; the section one only ever sees ~120 characters.
+    """
+    if not text:
+        return None, False
+    return _infer_section_label(text), _contains_financial(text)
+
+
+def _scan_chunks(texts: List[str]) -> List[Tuple[Optional[str], bool]]:
+    """_scan_chunk over many texts, spread across processes for very large documents."""
+    # Inline in Celery prefork children, which cannot start processes
+    workers = pool_workers(len(texts)) if len(texts) > TAG_PROCESS_THRESHOLD else 0
+    if not workers:
+        return [_scan_chunk(t) for t in texts]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_scan_chunk, texts, chunksize=TAG_PROCESS_CHUNKSIZE))
+
+
 class PineconeEmbedding:
     """
     Chunk → embed → upsert to Pinecone, idempotent per-document.
@@ -68,6 +316,7 @@ class PineconeEmbedding:
         namespace: Optional[str] = None,
         embed_model: Optional[str] = None,
         region: Optional[str] = None,
+        tenant_id: Any = None,
     ):
         self.index_name = index_name or getattr(
             settings, "PINECONE_INDEX_NAME", "ai-docs-index"
@@ -83,20 +332,37 @@ class PineconeEmbedding:
         api_key = getattr(settings, "PINECONE_API_KEY", None)
         if not api_key:
             raise RuntimeError("PINECONE_API_KEY not configured")
-        self.pc = Pinecone(api_key=api_key)
+        self.pc = _get_pinecone(api_key)
 
         oai_key = getattr(settings, "OPENAI_API_KEY", None)
         if not oai_key:
             raise RuntimeError("OPENAI_API_KEY not configured")
-        self.oa = OpenAI(api_key=oai_key)
+        self.oa = get_openai_client()
+        # Sent as the API `user` field so OpenAI can attribute traffic per tenant
+        self.user_tag = hash_tenant(tenant_id) if tenant_id is not None else None
 
         # Ensure index
         self._ensure_index()
-        self.index = self.pc.Index(self.index_name)
+        # gRPC sends binary floats over pooled HTTP/2 instead of JSON when available
+        self._grpc = _use_grpc()
+        self.index = _get_index(api_key, self.index_name, self._grpc)
+        # (monotonic timestamp, describe_index_stats result)
+        self._stats_cache: Optional[tuple] = None
+        # Upserts of one ingest run in threads (see _embed_and_upsert_async) and
+        # all of them touch the stats cache afterwards
+        self._stats_lock = threading.Lock()
 
     # ---------- Index / namespace utilities ----------
 
     def _ensure_index(self):
+        # Checked once per process; later instances reuse the known dimension
+        idx_dim = _checked_indexes.get(self.index_name)
+        if idx_dim is not None:
+            if idx_dim != self.dimension:
+                self.dimension = idx_dim
+                self.embed_model = _model_for_dim(idx_dim)
+            return
+
         if not self.pc.has_index(self.index_name):
             # create with the requested model's dim
             self.pc.create_index(
@@ -105,6 +371,7 @@ class PineconeEmbedding:
                 metric="cosine",
                 spec=ServerlessSpec(cloud="aws", region=self.region),
             )
+            _checked_indexes[self.index_name] = self.dimension
         else:
             desc = self.pc.describe_index(self.index_name)
             idx_dim = getattr(desc, "dimension", None)
@@ -117,17 +384,63 @@ class PineconeEmbedding:
             if idx_dim != self.dimension:
                 self.dimension = idx_dim
                 self.embed_model = _model_for_dim(idx_dim)
+            _checked_indexes[self.index_name] = idx_dim
+
+    def _get_stats(self, ttl: float = STATS_TTL_SECONDS):
+        """describe_index_stats, memoised on the instance for `ttl` seconds."""
+        with self._stats_lock:
+            now = time.monotonic()
+            if self._stats_cache is None or now - self._stats_cache[0] >= ttl:
+                self._stats_cache = (now, self.index.describe_index_stats())
+            return self._stats_cache[1]
+
+    def _invalidate_stats(self):
+        with self._stats_lock:
+            self._stats_cache = None
 
     def list_namespaces(self) -> List[str]:
-        stats = self.pc.Index(self.index_name).describe_index_stats()
+        stats = self._get_stats()
         return list(stats.get("namespaces", {}).keys())
 
     def delete_namespace_index(self, namespace: Optional[str] = None):
         ns = namespace or self.namespace
         try:
-            self.pc.Index(self.index_name).delete(delete_all=True, namespace=ns)
+            self.index.delete(delete_all=True, namespace=ns)
         except NotFoundException:
             return
+        finally:
+            self._invalidate_stats()
+
+    def _existing_vectors(self, document_id: str):
+        """
+        Return (ids stored for this document, {chunk_hash: values}) so unchanged
+        chunks can skip re-embedding. Vector ids are "<doc_id>:<index>:<hash8>",
+        so listing by the "<doc_id>:" prefix finds them without a metadata query.
+        """
+        if not self._namespace_exists():
+            return set(), {}
+        ids: set = set()
+        try:
+            for page in self.index.list(prefix=f"{document_id}:", namespace=self.namespace):
+                ids.update(page)
+        except NotFoundException:
+            return set(), {}
+
+        known: Dict[str, np.ndarray] = {}
+        id_list = list(ids)
+        for i in range(0, len(id_list), FETCH_BATCH):
+            resp = self.index.fetch(ids=id_list[i : i + FETCH_BATCH], namespace=self.namespace)
+            for v in resp.vectors.values():
+                md = v.metadata or {}
+                if not md.get("chunk_hash") or md.get("embedding_model") != self.embed_model:
+                    continue
+                known[md["chunk_hash"]] = np.asarray(v.values, dtype=np.float32)
+        return ids, known
+
+    def _delete_ids(self, ids: List[str]):
+        for i in range(0, len(ids), DELETE_BATCH):
+            self.index.delete(ids=ids[i : i + DELETE_BATCH], namespace=self.namespace)
+        self._invalidate_stats()
 
     def _delete_vectors_for_document(self, document_id: str):
         """Remove previous vectors for this document within this namespace (if present)."""
@@ -143,14 +456,198 @@ class PineconeEmbedding:
             # 404 when ns doesn't exist or nothing matched — treat as no-op
             return
 
+    def copy_document(
+        self,
+        source_document_id: str,
+        source_namespace: str,
+        *,
+        document_id: str,
+        file_name: Optional[str],
+        file_path: Optional[str],
+    ) -> int:
+        """
+        Index a document whose file is byte-identical to an already indexed one
+        by copying the source's vectors under the new document id; nothing is
+        chunked or embedded. Returns the number of vectors copied, 0 when the
+        source has none made with this engine's embedding model.
+        """
+        ids: set = set()
+        try:
+            for page in self.index.list(
+                prefix=f"{source_document_id}:", namespace=source_namespace
+            ):
+                ids.update(page)
+        except NotFoundException:
+            return 0
+
+        timestamp = datetime.utcnow().isoformat()
+        vectors: List[Dict[str, Any]] = []
+        id_list = list(ids)
+        for i in range(0, len(id_list), FETCH_BATCH):
+            resp = self.index.fetch(ids=id_list[i : i + FETCH_BATCH], namespace=source_namespace)
+            for vid, v in resp.vectors.items():
+                md = dict(v.metadata or {})
+                if md.get("embedding_model") != self.embed_model:
+                    return 0
+                values = np.asarray(v.values, dtype=np.float32)
+                md.update(document_id=document_id, timestamp=timestamp)
+                for name, value in (("file_name", file_name), ("file_path", file_path)):
+                    if value is None:
+                        md.pop(name, None)
+                    else:
+                        md[name] = value
+                vectors.append({
+                    "id": f"{document_id}:{vid.split(':', 1)[1]}",
+                    "values": values,
+                    "metadata": md,
+                })
+
+        self.upsert_vectors(vectors)
+        return len(vectors)
+
     # ---------- Embeddings ----------
 
-    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
-        resp = self.oa.embeddings.create(model=self.embed_model, input=texts)
-        return [d.embedding for d in resp.data]
+    @_openai_retry
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        resp = self.oa.embeddings.create(
+            model=self.embed_model, input=texts, **_user_kwargs(self.user_tag)
+        )
+        return np.asarray([d.embedding for d in resp.data], dtype=np.float32)
+
+    @_openai_retry
+    async def _embed_batch_async(self, client: AsyncOpenAI, texts: List[str]) -> np.ndarray:
+        resp = await client.embeddings.create(
+            model=self.embed_model, input=texts, **_user_kwargs(self.user_tag)
+        )
+        return np.asarray([d.embedding for d in resp.data], dtype=np.float32)
+
+    async def _embed_batches_async(
+        self, batches: List[List[str]]
+    ) -> List[np.ndarray]:
+        """Embed independent batches concurrently, at most EMBED_CONCURRENCY at a time."""
+        semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+        # A client per run: its connection pool is bound to this event loop
+        async with make_async_openai_client() as client:
+
+            async def bounded(texts: List[str]) -> np.ndarray:
+                async with semaphore:
+                    return await self._embed_batch_async(client, texts)
+
+            return await asyncio.gather(*(bounded(b) for b in batches))
+
+    def _embed_batches(self, batches: List[List[str]]) -> List[np.ndarray]:
+        """Sync entry point: fan batches out concurrently when there is more than one."""
+        if len(batches) <= 1:
+            return [self._embed_batch(b) for b in batches]
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self._embed_batches_async(batches))
+        # Already inside an event loop (async caller); fall back to sequential calls
+        return [self._embed_batch(b) for b in batches]
+
+    async def _embed_and_upsert_async(
+        self, batches: List[List[Dict[str, Any]]], build: Callable
+    ) -> int:
+        """
+        Producer/consumer ingest: chunk batches are embedded concurrently and each
+        finished batch is upserted, alongside other upserts, while later batches
+        are still being embedded.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=4)
+        semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+        async with make_async_openai_client() as client:
+
+            async def produce(batch: List[Dict[str, Any]]):
+                async with semaphore:
+                    embeds = await self._embed_batch_async(
+                        client, [c["text"] for c in batch]
+                    )
+                await queue.put(build(batch, embeds))
+
+            async def producer():
+                try:
+                    await asyncio.gather(*(produce(b) for b in batches))
+                finally:
+                    await queue.put(None)
+
+            async def consumer() -> int:
+                # Up to UPSERT_WORKERS upserts in flight; waiting for a free slot
+                # before taking the next batch keeps the queue's backpressure
+                slots = asyncio.Semaphore(UPSERT_WORKERS)
+                upserts = []
+                upserted = 0
+                while (vectors := await queue.get()) is not None:
+                    await slots.acquire()
+                    task = asyncio.create_task(asyncio.to_thread(self.upsert_vectors, vectors))
+                    task.add_done_callback(lambda _: slots.release())
+                    upserts.append(task)
+                    upserted += len(vectors)
+                await asyncio.gather(*upserts)
+                return upserted
+
+            _, upserted = await asyncio.gather(producer(), consumer())
+        return upserted
+
+    def _embed_and_upsert(
+        self, batches: List[List[Dict[str, Any]]], build: Callable
+    ) -> int:
+        """Sync entry point for the embed → upsert pipeline. Returns vectors upserted."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self._embed_and_upsert_async(batches, build))
+        # Already inside an event loop (async caller); run the stages back to back
+        upserted = 0
+        for batch in batches:
+            vectors = build(batch, self._embed_batch([c["text"] for c in batch]))
+            self.upsert_vectors(vectors)
+            upserted += len(vectors)
+        return upserted
 
     # ---------- Public API ----------
 
+    def _chunk(self, text: str) -> List[Dict[str, Any]]:
+        max_tokens = getattr(settings, "CHUNK_SIZE", 1000)
+        overlap_tokens = getattr(settings, "CHUNK_OVERLAP", 200)
+        return chunk_text(text, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+
+    @staticmethod
+    def _batch_chunks(chunks: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Group chunks into embedding-request batches."""
+        BATCH = 100
+        return [chunks[i : i + BATCH] for i in range(0, len(chunks), BATCH)]
+
+    def _chunk_batches(self, text: str) -> List[List[Dict[str, Any]]]:
+        return self._batch_chunks(self._chunk(text))
+
+    def _build_vectors(
+        self,
+        batch: List[Dict[str, Any]],
+        embeds,
+        *,
+        document_id: Optional[str],
+        file_name: Optional[str],
+        file_path: Optional[str],
+        truncate_metadata_text_to: Optional[int] = None,
+        timestamp: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        # Fields shared by every chunk of the document are built once; one
+        # ingest timestamp is used for the whole document.
+        shared: Dict[str, Any] = {
+            "document_id": document_id,
+            "file_name": file_name,
+            "file_path": file_path,
+            "embedding_model": self.embed_model,
+            "timestamp": timestamp or datetime.utcnow().isoformat(),
+        }
+        # Resolve the "noid" fallback once rather than in every vector id
+        id_prefix = document_id or "noid"
+        return [
+            _vector_dict(c, vec, shared, id_prefix, truncate_metadata_text_to)
+            for c, vec in zip(batch, embeds)
+        ]
+
     def create_vector_embeddings(
         self,
         text: str,
@@ -163,61 +660,33 @@ class PineconeEmbedding:
     ) -> List[Dict[str, Any]]:
         """
         Chunk a single text, embed, and build Pinecone vectors (not upserted yet).
+        Metadata is a ChunkMeta; upsert_vectors converts it to a dict.
         """
-        max_tokens = getattr(settings, "CHUNK_SIZE", 1000)
-        overlap_tokens = getattr(settings, "CHUNK_OVERLAP", 200)
-        chunks = chunk_text(text, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
-        if not chunks:
+        batches = self._chunk_batches(text)
+        if not batches:
             return []
 
+        batch_embeds = self._embed_batches([[c["text"] for c in b] for b in batches])
+        timestamp = datetime.utcnow().isoformat()
         vectors: List[Dict[str, Any]] = []
-        BATCH = 100
-        for i in range(0, len(chunks), BATCH):
-            batch = chunks[i : i + BATCH]
-            embeds = self._embed_batch([c["text"] for c in batch])
-            for c, vec in zip(batch, embeds):
-                meta_text = c["text"]
-                if (
-                    truncate_metadata_text_to
-                    and len(meta_text) > truncate_metadata_text_to
-                ):
-                    meta_text = meta_text[:truncate_metadata_text_to]
-
-                # Deterministic vector ID for idempotency
-                base = f"{document_id or 'noid'}:{c['index']}:{c['hash'][:8]}"
-                # Build metadata without nulls (Pinecone rejects null values)
-                metadata: Dict[str, Any] = {
-                    "document_id": document_id,
-                    "file_name": file_name,
-                    "file_path": file_path,
-                    "chunk_index": c["index"],
-                    "chunk_hash": c["hash"],
-                    "text": meta_text,
-                    "embedding_model": self.embed_model,
-                    "timestamp": datetime.utcnow().isoformat(),
-                }
-                inferred = _infer_section_label(meta_text)
-                if inferred:
-                    metadata["section_label"] = inferred
-                # Financial tagging to help filtering/boosting
-                try:
-                    if re.search(r"£[\d,]+|contractor shall pay|subcontract sum", meta_text, re.I):
-                        metadata["contains_financial_info"] = True
-                except Exception:
-                    pass
-                vectors.append(
-                    {
-                        "id": base,
-                        "values": vec,
-                        "metadata": metadata,
-                    }
+        for batch, embeds in zip(batches, batch_embeds):
+            vectors.extend(
+                self._build_vectors(
+                    batch,
+                    embeds,
+                    document_id=document_id,
+                    file_name=file_name,
+                    file_path=file_path,
+                    truncate_metadata_text_to=truncate_metadata_text_to,
+                    timestamp=timestamp,
                 )
+            )
         return vectors
 
     def _namespace_exists(self) -> bool:
         """Return True if namespace exists; False otherwise."""
         try:
-            stats = self.index.describe_index_stats()
+            stats = self._get_stats()
             return self.namespace in (stats.get("namespaces") or {})
         except Exception:
             # If stats call fails, be conservative
@@ -226,12 +695,55 @@ class PineconeEmbedding:
     def upsert_vectors(self, vectors: List[Dict[str, Any]]):
         if not vectors:
             return
-        BATCH = 100
-        for i in range(0, len(vectors), BATCH):
-            self.index.upsert(vectors=vectors[i : i + BATCH], namespace=self.namespace)
-
-    def similarity_search(self, query: str, top_k: int = 7, filters: Optional[Dict[str, Any]] = None):
-        emb = self._embed_batch([query])[0]
+        bytes_per_float = _GRPC_BYTES_PER_FLOAT if self._grpc else _JSON_BYTES_PER_FLOAT
+        batches = list(
+            _upsert_batches([_wire_vector(v) for v in vectors], bytes_per_float)
+        )
+        if len(batches) == 1:
+            self.index.upsert(vectors=batches[0], namespace=self.namespace)
+        else:
+            # Both handles send async_req upserts concurrently (gRPC over its
+            # channel, REST on the index's pool_threads); join them at the end
+            pending = [
+                self.index.upsert(vectors=batch, namespace=self.namespace, async_req=True)
+                for batch in batches
+            ]
+            for result in pending:
+                if self._grpc:
+                    result.result()
+                else:
+                    result.get()
+        self._after_upsert()
+
+    def _after_upsert(self):
+        # The first upsert creates the namespace; drop stats that predate it
+        with self._stats_lock:
+            if self._stats_cache is not None and self.namespace not in (
+                self._stats_cache[1].get("namespaces") or {}
+            ):
+                self._stats_cache = None
+
+    def similarity_search(
+        self,
+        query: Optional[str] = None,
+        top_k: int = 7,
+        filters: Optional[Dict[str, Any]] = None,
+        *,
+        query_embedding=None,
+    ):
+        """
+        Query the namespace by text, or by `query_embedding` when the caller already
+        has one (skips the embeddings call entirely).
+        """
+        if query_embedding is not None:
+            emb = np.asarray(query_embedding, dtype=np.float32).tolist()
+        elif query is not None:
+            # Whitespace-only differences (retyped/refreshed queries) share a cache entry
+            emb = list(
+                _cached_embed(self.embed_model, " ".join(query.split()), self.user_tag)
+            )
+        else:
+            raise ValueError("similarity_search needs a query or a query_embedding")
         return self.index.query(
             namespace=self.namespace,
             vector=emb,
@@ -261,33 +773,174 @@ class PineconeEmbedding:
         if delete_namespace:
             self.delete_namespace_index(delete_namespace)
 
+        document_id, build, reused, to_embed, known, stale = self._plan_ingest(
+            text, id, file_name, file_path, truncate_metadata_text_to
+        )
+
+        upserted = 0
+        if reused:
+            vectors = build(reused, [known[c["hash"]] for c in reused])
+            self.upsert_vectors(vectors)
+            upserted += len(vectors)
+        if to_embed:
+            upserted += self._embed_and_upsert(self._batch_chunks(to_embed), build)
+
+        # Drop vectors for chunks that are no longer in the document
+        if stale:
+            self._delete_ids(stale)
+
+        return {
+            "upserted": upserted,
+            "document_id": document_id,
+            "namespace": self.namespace,
+        }
+
+    def embed_only(
+        self,
+        *,
+        text: Optional[str],
+        id: Optional[str] = None,
+        file_name: Optional[str] = None,
+        file_path: Optional[str] = None,
+        user: Any = None,
+        truncate_metadata_text_to: Optional[int] = 1200,
+    ) -> Dict[str, Any]:
+        """
+        Chunk and embed a document like main(), but return the vectors instead of
+        upserting them, so several documents can share one bulk_upsert.
+        """
+        (result,) = self.embed_documents(
+            [{"text": text, "id": id, "file_name": file_name, "file_path": file_path}],
+            truncate_metadata_text_to=truncate_metadata_text_to,
+        )
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def embed_documents(
+        self,
+        documents: List[Dict[str, Any]],
+        truncate_metadata_text_to: Optional[int] = 1200,
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        embed_only for several documents at once. Each item holds the text, id,
+        file_name and file_path of one document. Chunks needing embedding are
+        pooled across documents, so a small document shares an embeddings
+        request with its neighbours instead of sending a short one of its own.
+
+        Returns the embed_only result per document, or the exception raised while
+        planning it; a failed embeddings request raises for the whole call.
+        """
+        plans: List[Any] = []
+        pooled: List[Tuple[int, Dict[str, Any]]] = []
+        for i, doc in enumerate(documents):
+            try:
+                plan = self._plan_ingest(
+                    doc.get("text"),
+                    doc.get("id"),
+                    doc.get("file_name"),
+                    doc.get("file_path"),
+                    truncate_metadata_text_to,
+                )
+            except Exception as e:
+                plans.append(e)
+                continue
+            plans.append(plan)
+            pooled.extend((i, c) for c in plan[3])
+
+        # (chunks, embeddings) per document, in chunk order
+        embedded: Dict[int, Tuple[List[Dict[str, Any]], list]] = {}
+        batches = self._batch_chunks(pooled)
+        batch_embeds = self._embed_batches([[c["text"] for _, c in b] for b in batches])
+        for batch, embeds in zip(batches, batch_embeds):
+            for (i, c), vec in zip(batch, embeds):
+                chunks, vecs = embedded.setdefault(i, ([], []))
+                chunks.append(c)
+                vecs.append(vec)
+
+        results: List[Union[Dict[str, Any], Exception]] = []
+        for i, plan in enumerate(plans):
+            if isinstance(plan, Exception):
+                results.append(plan)
+                continue
+            document_id, build, reused, _, known, stale = plan
+            vectors: List[Dict[str, Any]] = []
+            if reused:
+                vectors.extend(build(reused, [known[c["hash"]] for c in reused]))
+            if i in embedded:
+                vectors.extend(build(*embedded[i]))
+            results.append({"document_id": document_id, "vectors": vectors, "stale_ids": stale})
+        return results
+
+    def bulk_upsert(self, prepared: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Upsert the embed_only results of several documents together: their
+        vectors are packed into shared upsert requests and their stale ids into
+        shared deletes. Returns a main()-style result per document.
+        """
+        self.upsert_vectors(list(itertools.chain.from_iterable(p["vectors"] for p in prepared)))
+        stale = list(itertools.chain.from_iterable(p["stale_ids"] for p in prepared))
+        if stale:
+            self._delete_ids(stale)
+        return [
+            {
+                "upserted": len(p["vectors"]),
+                "document_id": p["document_id"],
+                "namespace": self.namespace,
+            }
+            for p in prepared
+        ]
+
+    def _plan_ingest(
+        self,
+        text: Optional[str],
+        id: Optional[str],
+        file_name: Optional[str],
+        file_path: Optional[str],
+        truncate_metadata_text_to: Optional[int],
+    ):
+        """
+        Resolve the document id and split its chunks into those whose stored
+        values can be reused and those that need embedding.
+
+        Returns (document_id, build, reused, to_embed, known, stale_ids).
+        """
         # Document identity
         document_id = self._parse_document_id(file_path) or id
         if not document_id:
             seed = (file_name or "") + (text or "")[:128]
-            document_id = hashlib.sha256(seed.encode("utf-8")).hexdigest()[:16]
-
-        # Idempotency: clear old vectors for this document in this namespace
-        if self._namespace_exists():
-            self._delete_vectors_for_document(document_id)
-        # else: no-op; upsert will auto-create the namespace
+            document_id = hashlib.blake2b(seed.encode("utf-8"), digest_size=8).hexdigest()
 
-        # Create vectors (chunk → embed)
-        vectors = self.create_vector_embeddings(
-            text=text or "",
+        # Turns (chunks, embeddings) into vectors carrying this document's metadata
+        build = functools.partial(
+            self._build_vectors,
             document_id=document_id,
             file_name=file_name,
             file_path=file_path,
-            user=user,
             truncate_metadata_text_to=truncate_metadata_text_to,
+            timestamp=datetime.utcnow().isoformat(),
         )
-        # Upsert
-        self.upsert_vectors(vectors)
-        return {
-            "upserted": len(vectors),
-            "document_id": document_id,
-            "namespace": self.namespace,
-        }
+        chunks = self._chunk(text or "")
+
+        # Incremental re-ingest: chunks whose vector id already exists are left
+        # as-is, chunks whose text was seen before reuse the stored values, and
+        # only genuinely new text is sent to the embeddings API.
+        existing_ids, known = self._existing_vectors(document_id)
+        chunk_ids = [_vector_id(document_id, c) for c in chunks]
+        pending = [c for c, vid in zip(chunks, chunk_ids) if vid not in existing_ids]
+        if len(pending) > TAG_PROCESS_THRESHOLD:
+            texts = [
+                c["text"][:truncate_metadata_text_to] if truncate_metadata_text_to else c["text"]
+                for c in pending
+            ]
+            for c, tags in zip(pending, _scan_chunks(texts)):
+                c["tags"] = tags
+        reused = [c for c in pending if c["hash"] in known]
+        to_embed = [c for c in pending if c["hash"] not in known]
+
+        # Vectors for chunks that are no longer in the document
+        stale = list(existing_ids.difference(chunk_ids))
+        return document_id, build, reused, to_embed, known, stale
 
     @staticmethod
     def _parse_document_id(file_path: Optional[str]) -> Optional[str]:
@@ -299,11 +952,11 @@ class PineconeEmbedding:
 
 # Optional thin wrapper if you want a service facade with extra helpers
 class PineconeService:
-    def __init__(self, namespace: Optional[str] = None):
+    def __init__(self, namespace: Optional[str] = None, tenant_id: Any = None):
         self.index_name = getattr(settings, "PINECONE_INDEX_NAME", "ai-docs-index")
         self.namespace = namespace
         self.engine = PineconeEmbedding(
-            index_name=self.index_name, namespace=self.namespace
+            index_name=self.index_name, namespace=self.namespace, tenant_id=tenant_id
         )
 
     def store_text(
@@ -317,6 +970,21 @@ class PineconeService:
     def search(self, query: str, top_k: int = 7):
         return self.engine.similarity_search(query, top_k=top_k)
 
+    def search_similar_chunks(
+        self, query_embedding, user_id: Optional[str] = None, top_k: int = 7
+    ):
+        """
+        Query with a precomputed embedding and return the matches.
+        Namespaces are already scoped per user/session, so user_id is not used as a filter.
+        """
+        result = self.engine.index.query(
+            namespace=self.engine.namespace,
+            vector=np.asarray(query_embedding, dtype=np.float32).tolist(),
+            top_k=top_k,
+            include_metadata=True,
+        )
+        return getattr(result, "matches", None) or result.get("matches", [])
+
     def wipe_document(self, document_id: str):
         self.engine._delete_vectors_for_document(document_id)
 
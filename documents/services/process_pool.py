@@ -0,0 +1,27 @@
+"""
+Sizing for the process pools that spread CPU-bound document work (PDF pages,
+chunk tagging) across cores.
+"""
+
+import multiprocessing
+import os
+
+
+def in_daemon_process() -> bool:
+    """
+    True inside a daemonic process such as a Celery prefork child, which may
+    not start child processes; work there has to run inline.
+    """
+    return multiprocessing.current_process().daemon
+
+
+def pool_workers(jobs: int) -> int:
+    """
+    Worker processes to use for `jobs` independent pieces of work: at most one
+    per CPU, and 0 (run inline) when fewer than two would be used or the
+    current process cannot start children.
+    """
+    if in_daemon_process():
+        return 0
+    workers = min(os.cpu_count() or 1, jobs)
+    return workers if workers >= 2 else 0
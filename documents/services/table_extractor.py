@@ -5,10 +5,22 @@ Extracts tables from PDFs and converts them to searchable text format.
 Handles checkboxes, tick marks, and structured data.
 """
 
+import io
+import logging
 import re
-from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from dataclasses import dataclass
 
+from .process_pool import pool_workers
+
+logger = logging.getLogger(__name__)
+
+
+# Documents with at least this many pages per available worker have their
+# table extraction split across processes
+PARALLEL_MIN_PAGES = 20
+
 
 @dataclass
 class TableCell:
@@ -24,7 +36,7 @@ class TableCell:
 class ExtractedTable:
     """Represents an extracted table with metadata"""
     headers: List[str]
-    rows: List[List[str]]
+    rows: List[List[str]]  # normalized cell strings
     page_number: int
     table_index: int
     has_checkboxes: bool = False
@@ -43,10 +55,8 @@ class ExtractedTable:
         lines.append(header_line)
         lines.append("-" * len(header_line))
 
-        # Rows
-        for row in self.rows:
-            row_line = " | ".join(str(cell) for cell in row)
-            lines.append(row_line)
+        # Rows (cells are already normalized strings)
+        lines.extend(" | ".join(row) for row in self.rows)
 
         return "\n".join(lines)
 
@@ -58,8 +68,8 @@ class ExtractedTable:
         for row in self.rows:
             if len(row) >= 2:
                 # Assume first column is key, rest are values
-                key = str(row[0]).strip()
-                values = [str(v).strip() for v in row[1:] if str(v).strip()]
+                key = row[0].strip()
+                values = [v for v in (c.strip() for c in row[1:]) if v]
 
                 if key and values:
                     # Create searchable phrase
@@ -78,6 +88,13 @@ class TableExtractor:
         'checked': ['✓', '✔', '☑', '✗', '×', 'x', 'X', 'Yes', 'YES', 'yes', 'Y', 'True'],
         'unchecked': ['☐', '□', 'No', 'NO', 'no', 'N', 'False', '-', ''],
     }
+    # Unchecked values are only ever compared for equality, so a set lookup suffices
+    _UNCHECKED_VALUES = frozenset(CHECKBOX_PATTERNS['unchecked'])
+    # Checked patterns match as substrings. Every multi-character pattern except
+    # 'yes' and 'True' contains one of the single-character ones ('Yes'/'YES' -> 'Y'),
+    # so "any checked char, or 'yes'/'True'" is the same test in one pass.
+    _CHECKED_CHARS = frozenset(p for p in CHECKBOX_PATTERNS['checked'] if len(p) == 1)
+    _CHECKED_WORDS = ('yes', 'True')
 
     def __init__(self):
         try:
@@ -101,14 +118,14 @@ class TableExtractor:
         cell_text = cell_text.strip()
 
         # Check for checked patterns
-        for pattern in self.CHECKBOX_PATTERNS['checked']:
-            if pattern in cell_text or cell_text == pattern:
-                return True, 'checked'
+        if not self._CHECKED_CHARS.isdisjoint(cell_text) or any(
+            word in cell_text for word in self._CHECKED_WORDS
+        ):
+            return True, 'checked'
 
         # Check for unchecked patterns
-        for pattern in self.CHECKBOX_PATTERNS['unchecked']:
-            if cell_text == pattern:
-                return True, 'unchecked'
+        if cell_text in self._UNCHECKED_VALUES:
+            return True, 'unchecked'
 
         return False, None
 
@@ -140,76 +157,195 @@ class TableExtractor:
             List of ExtractedTable objects
         """
         if not self.available:
-            print("pdfplumber not available for table extraction")
+            logger.warning("pdfplumber not available for table extraction")
             return []
 
-        extracted_tables = []
-
         try:
-            with self.pdfplumber.open(pdf_path) as pdf:
-                print(f"[Table Extractor] Processing {len(pdf.pages)} pages")
+            return list(self.iter_tables_from_pdf(pdf_path))
+        except Exception:
+            logger.exception("Error extracting tables from PDF")
+            return []
+
+    def iter_tables_from_pdf(self, pdf_path: str) -> Iterator[ExtractedTable]:
+        """
+        Yield tables page by page, releasing each page's parsed objects once its
+        tables are out. Long documents are split into page ranges extracted in
+        worker processes; tables still come out in page order. Errors propagate
+        to the caller.
+        """
+        with self.pdfplumber.open(pdf_path) as pdf:
+            page_count = len(pdf.pages)
+            logger.info("[Table Extractor] Processing %d pages", page_count)
+            form_checkboxes = self._extract_acroform_checkboxes(pdf)
+            if form_checkboxes:
+                logger.info(
+                    "[Table Extractor] Using %d form checkbox field(s)", len(form_checkboxes)
+                )
+
+            # Inline in Celery prefork children, which cannot start processes
+            workers = pool_workers(page_count // PARALLEL_MIN_PAGES)
+            if not workers:
                 for page_num, page in enumerate(pdf.pages, start=1):
-                    # Extract tables from this page
-                    tables = page.extract_tables()
-
-                    if not tables:
-                        print(f"  Page {page_num}: No tables found")
-                        continue
-                    else:
-                        print(f"  Page {page_num}: Found {len(tables)} table(s)")
-
-                    for table_idx, table in enumerate(tables):
-                        if not table or len(table) < 2:  # Need at least header + 1 row
-                            continue
-
-                        # First row is typically headers
-                        raw_headers = table[0]
-                        raw_rows = table[1:]
-
-                        # Normalize headers
-                        headers = [self.normalize_cell_value(h) if h else f"Column_{i}"
-                                  for i, h in enumerate(raw_headers)]
-
-                        # Normalize rows and detect checkboxes
-                        normalized_rows = []
-                        has_checkboxes = False
-
-                        for row in raw_rows:
-                            if not row:
-                                continue
-
-                            normalized_row = []
-                            for cell in row:
-                                cell_text = cell if cell else ""
-                                is_checkbox, state = self.detect_checkbox_state(cell_text)
-
-                                if is_checkbox:
-                                    has_checkboxes = True
-                                    normalized_value = "Yes" if state == 'checked' else "No"
-                                else:
-                                    normalized_value = self.normalize_cell_value(cell_text)
-
-                                normalized_row.append(normalized_value)
-
-                            # Only add non-empty rows
-                            if any(cell.strip() for cell in normalized_row):
-                                normalized_rows.append(normalized_row)
-
-                        if normalized_rows:
-                            extracted_table = ExtractedTable(
-                                headers=headers,
-                                rows=normalized_rows,
-                                page_number=page_num,
-                                table_index=table_idx,
-                                has_checkboxes=has_checkboxes
-                            )
-                            extracted_tables.append(extracted_table)
-
-        except Exception as e:
-            print(f"Error extracting tables from PDF: {e}")
+                    yield from self._page_tables(page, page_num, form_checkboxes)
+                return
+
+        # Each worker reopens the PDF; pdfminer state is not picklable
+        bounds = [page_count * i // workers for i in range(workers + 1)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for tables in pool.map(
+                _extract_page_range,
+                [pdf_path] * workers,
+                bounds[:-1],
+                bounds[1:],
+                [form_checkboxes] * workers,
+            ):
+                yield from tables
+
+    def _page_tables(
+        self, page, page_num: int, form_checkboxes: Optional[Dict[str, bool]] = None
+    ) -> List[ExtractedTable]:
+        """Extract and normalise the tables on a single page."""
+        tables = page.extract_tables()
+        page.close()
+
+        if not tables:
+            logger.debug("Page %d: No tables found", page_num)
             return []
+        logger.debug("Page %d: Found %d table(s)", page_num, len(tables))
+
+        extracted = []
+        for table_idx, table in enumerate(tables):
+            extracted_table = self._build_table(table, page_num, table_idx, form_checkboxes)
+            if extracted_table is not None:
+                extracted.append(extracted_table)
+        return extracted
 
-        return extracted_tables
+    @staticmethod
+    def _field_key(name: str) -> str:
+        """Normalise a form field name or row label for lookup."""
+        return re.sub(r'[^a-z0-9]+', ' ', name.lower()).strip()
+
+    def _extract_acroform_checkboxes(self, pdf) -> Dict[str, bool]:
+        """
+        Read checkbox state straight from the PDF's /AcroForm tree.
+
+        Returns {normalised field name: checked}. Empty for static or scanned
+        PDFs, in which case the glyph heuristic is used for every cell.
+        """
+        try:
+            from pdfminer.pdftypes import resolve1
+            from pdfminer.psparser import PSLiteral
+
+            acroform = resolve1(pdf.doc.catalog.get('AcroForm'))
+            if not acroform:
+                return {}
+            fields = resolve1(acroform.get('Fields')) or []
+        except Exception:
+            return {}
+
+        def literal(value) -> Optional[str]:
+            value = resolve1(value)
+            if isinstance(value, PSLiteral):
+                return value.name if isinstance(value.name, str) else value.name.decode('latin-1')
+            if isinstance(value, bytes):
+                return value.decode('latin-1')
+            return value if isinstance(value, str) else None
+
+        def text(value) -> str:
+            value = resolve1(value)
+            if isinstance(value, bytes):
+                if value[:2] == b'\xfe\xff':
+                    return value[2:].decode('utf-16-be', 'ignore')
+                return value.decode('latin-1')
+            return value if isinstance(value, str) else ""
+
+        checkboxes: Dict[str, bool] = {}
+        # (field, inherited field type, parent name); /FT and /T inherit via /Kids
+        stack = [(field, None, "") for field in fields]
+        while stack:
+            field, field_type, parent = stack.pop()
+            field = resolve1(field)
+            if not isinstance(field, dict):
+                continue
+            field_type = literal(field.get('FT')) or field_type
+            name = text(field.get('T'))
+            full_name = f"{parent}.{name}" if parent and name else (name or parent)
+
+            kids = resolve1(field.get('Kids'))
+            if kids:
+                stack.extend((kid, field_type, full_name) for kid in kids)
+            if field_type != 'Btn' or not name:
+                continue
+            state = literal(field.get('V')) or literal(field.get('AS'))
+            if state is None:
+                continue
+            checked = state != 'Off'
+            checkboxes[self._field_key(name)] = checked
+            if full_name != name:
+                checkboxes[self._field_key(full_name)] = checked
+        return checkboxes
+
+    def _build_table(
+        self,
+        table: List[List[Optional[str]]],
+        page_num: int,
+        table_idx: int,
+        form_checkboxes: Optional[Dict[str, bool]] = None,
+    ) -> Optional[ExtractedTable]:
+        if not table or len(table) < 2:  # Need at least header + 1 row
+            return None
+
+        # First row is typically headers
+        raw_headers = table[0]
+        raw_rows = table[1:]
+
+        # Normalize headers
+        headers = [self.normalize_cell_value(h) if h else f"Column_{i}"
+                   for i, h in enumerate(raw_headers)]
+
+        # Normalize rows and detect checkboxes
+        normalized_rows = []
+        has_checkboxes = False
+
+        for row in raw_rows:
+            if not row:
+                continue
+
+            # Form state for this row, looked up by its key (first) cell
+            form_state = None
+            if form_checkboxes and row[0]:
+                form_state = form_checkboxes.get(self._field_key(row[0]))
+
+            normalized_row = []
+            for col, cell in enumerate(row):
+                cell_text = cell if cell else ""
+                is_checkbox, state = self.detect_checkbox_state(cell_text)
+
+                if form_state is not None and col > 0 and (is_checkbox or not cell_text.strip()):
+                    has_checkboxes = True
+                    normalized_value = "Yes" if form_state else "No"
+                elif is_checkbox:
+                    has_checkboxes = True
+                    normalized_value = "Yes" if state == 'checked' else "No"
+                else:
+                    # Same as normalize_cell_value without re-detecting
+                    normalized_value = cell_text.strip()
+
+                normalized_row.append(normalized_value)
+
+            # Only add non-empty rows
+            if any(cell.strip() for cell in normalized_row):
+                normalized_rows.append(normalized_row)
+
+        if not normalized_rows:
+            return None
+        return ExtractedTable(
+            headers=headers,
+            rows=normalized_rows,
+            page_number=page_num,
+            table_index=table_idx,
+            has_checkboxes=has_checkboxes
+        )
 
     def tables_to_searchable_text(self, tables: List[ExtractedTable]) -> str:
         """
@@ -220,23 +356,9 @@ class TableExtractor:
         2. Is searchable by semantic search
         3. Preserves table structure and relationships
         """
-        if not tables:
-            return ""
-
-        sections = []
-
-        for table in tables:
-            # Add table as formatted text
-            sections.append(table.to_text())
-            sections.append("")  # Empty line separator
-
-            # Add search-optimized key-value pairs
-            search_text = table.to_search_text()
-            if search_text:
-                sections.append(f"[Table Data: {search_text}]")
-                sections.append("")
-
-        return "\n".join(sections)
+        out = io.StringIO()
+        self.write_tables_text(tables, out)
+        return out.getvalue()
 
     def extract_table_metadata(self, tables: List[ExtractedTable]) -> Dict[str, Any]:
         """
@@ -262,6 +384,55 @@ class TableExtractor:
 
         return metadata
 
+    def write_tables_text(
+        self, tables: Iterable[ExtractedTable], out: io.StringIO
+    ) -> Dict[str, Any]:
+        """
+        Write the searchable text for each table to `out` as it arrives and
+        return the table metadata ({} when there were no tables)
+        """
+        table_count = 0
+        tables_with_checkboxes = 0
+        total_rows = 0
+        all_headers = set()
+
+        for table in tables:
+            if table_count:
+                out.write("\n")
+            table_count += 1
+            tables_with_checkboxes += table.has_checkboxes
+            total_rows += len(table.rows)
+            all_headers.update(table.headers)
+
+            # Table as formatted text, then search-optimized key-value pairs
+            out.write(table.to_text())
+            out.write("\n")
+            search_text = table.to_search_text()
+            if search_text:
+                out.write(f"\n[Table Data: {search_text}]\n")
+
+        if not table_count:
+            return {}
+        return {
+            'has_tables': True,
+            'table_count': table_count,
+            'tables_with_checkboxes': tables_with_checkboxes,
+            'total_rows': total_rows,
+            'table_headers': list(all_headers),
+        }
+
+
+def _extract_page_range(
+    pdf_path: str, start: int, end: int, form_checkboxes: Dict[str, bool]
+) -> List[ExtractedTable]:
+    """Worker task: extract tables from pages [start, end) of a PDF."""
+    extractor = TableExtractor()
+    tables = []
+    with extractor.pdfplumber.open(pdf_path) as pdf:
+        for index in range(start, end):
+            tables.extend(extractor._page_tables(pdf.pages[index], index + 1, form_checkboxes))
+    return tables
+
 
 def extract_and_merge_tables_with_text(pdf_path: str, extracted_text: str) -> Tuple[str, Dict[str, Any]]:
     """
@@ -279,29 +450,27 @@ def extract_and_merge_tables_with_text(pdf_path: str, extracted_text: str) -> Tu
     if not extractor.available:
         return extracted_text, {'has_tables': False}
 
-    # Extract tables
-    tables = extractor.extract_tables_from_pdf(pdf_path)
-
-    if not tables:
-        return extracted_text, {'has_tables': False}
-
-    # Convert tables to searchable text
-    table_text = extractor.tables_to_searchable_text(tables)
-
     # Merge with extracted text
     # Strategy: Add tables at the end with clear markers
-    merged_text = extracted_text.strip()
-
-    if table_text:
-        merged_text += "\n\n" + "="*50 + "\n"
-        merged_text += "EXTRACTED TABLES\n"
-        merged_text += "="*50 + "\n\n"
-        merged_text += table_text
+    merged = io.StringIO()
+    merged.write(extracted_text.strip())
+    merged.write("\n\n" + "="*50 + "\n")
+    merged.write("EXTRACTED TABLES\n")
+    merged.write("="*50 + "\n\n")
+
+    # Tables are converted to searchable text and appended as they stream in
+    try:
+        table_metadata = extractor.write_tables_text(
+            extractor.iter_tables_from_pdf(pdf_path), merged
+        )
+    except Exception:
+        logger.exception("Error extracting tables from PDF")
+        return extracted_text, {'has_tables': False}
 
-    # Get table metadata
-    table_metadata = extractor.extract_table_metadata(tables)
+    if not table_metadata:
+        return extracted_text, {'has_tables': False}
 
-    return merged_text, table_metadata
+    return merged.getvalue(), table_metadata
 
 
 # Example usage
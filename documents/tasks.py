@@ -0,0 +1,60 @@
+import openai
+from celery import shared_task
+from pinecone.exceptions import PineconeProtocolError, ServiceException
+
+from .models import Document
+from .services.document_pipeline import (
+    generate_risk_factors,
+    generate_summary,
+    process_document,
+)
+
+
+# Errors worth another attempt: network failures, rate limits and 5xx responses
+# that outlasted the in-process OpenAI retries. A failed attempt leaves the
+# document FAILED, which process_document picks up again on retry.
+TRANSIENT_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    PineconeProtocolError,
+    ServiceException,
+)
+
+
+@shared_task(
+    ignore_result=True,
+    autoretry_for=TRANSIENT_ERRORS,
+    max_retries=3,
+    retry_backoff=30,
+    retry_backoff_max=600,
+)
+def process_document_task(document_id: str, namespace: str):
+    """Index an uploaded document outside the request/response cycle."""
+    # The stored upload is read right away; fetch it with the document
+    document = Document.objects.select_related("asset").filter(id=document_id).first()
+    if document is None:
+        return
+    process_document(document, namespace)
+
+
+@shared_task(ignore_result=True)
+def generate_summary_task(document_id: str):
+    """Generate a document summary with OpenAI; clients poll the document detail."""
+    # The stored upload is only read when its text is not cached
+    document = Document.objects.filter(id=document_id, deleted_at__isnull=True).first()
+    if document is None:
+        return
+    generate_summary(document)
+
+
+@shared_task(ignore_result=True)
+def generate_risk_factors_task(document_id: str):
+    """Generate document risk factors with OpenAI; clients poll the document detail."""
+    # The stored upload is only read when its text is not cached
+    document = Document.objects.filter(id=document_id, deleted_at__isnull=True).first()
+    if document is None:
+        return
+    generate_risk_factors(document)
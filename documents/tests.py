@@ -1,3 +1,336 @@
-from django.test import TestCase
+import hashlib
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from chat.models import ChatSession
+from documents.models import Document
+from documents.services import pinecone_service
+from documents.services.openai_service import hash_tenant
+from documents.services.document_pipeline import _claim, _copy_from_twin, _start_processing
+from documents.services.pinecone_service import PineconeEmbedding
+from documents.views import DocumentListPagination
+
+
+def make_user(name, **fields):
+    return User.objects.create_user(
+        username=name, email=f"{name}@example.com", password="pass", **fields
+    )
+
+
+def make_document(user, session=None, **fields):
+    fields.setdefault("title", "Contract")
+    fields.setdefault("file_name", f"{fields['title']}.pdf")
+    fields.setdefault("file_size", 3)
+    return Document.objects.create(user=user, session=session, **fields)
+
+
+class FakeIndex:
+    """In-memory stand-in for a Pinecone index handle."""
+
+    def __init__(self):
+        self.namespaces = {}
+
+    def describe_index_stats(self):
+        return {
+            "namespaces": {
+                ns: {"vector_count": len(vectors)}
+                for ns, vectors in self.namespaces.items()
+                if vectors
+            }
+        }
+
+    def list(self, prefix, namespace):
+        ids = [vid for vid in self.namespaces.get(namespace, {}) if vid.startswith(prefix)]
+        return iter([ids] if ids else [])
+
+    def fetch(self, ids, namespace):
+        stored = self.namespaces.get(namespace, {})
+        return SimpleNamespace(
+            vectors={
+                vid: SimpleNamespace(values=stored[vid][0], metadata=stored[vid][1])
+                for vid in ids
+                if vid in stored
+            }
+        )
+
+    def upsert(self, vectors, namespace, async_req=False):
+        stored = self.namespaces.setdefault(namespace, {})
+        for v in vectors:
+            stored[v["id"]] = (v["values"], v.get("metadata"))
+
+    def delete(self, ids=None, namespace=None, delete_all=False, filter=None):
+        stored = self.namespaces.get(namespace, {})
+        if delete_all:
+            stored.clear()
+        for vid in ids or []:
+            stored.pop(vid, None)
+
+
+def paragraph_chunks(text):
+    return [
+        {
+            "text": p,
+            "hash": hashlib.blake2b(p.encode("utf-8"), digest_size=16).hexdigest(),
+            "index": i,
+        }
+        for i, p in enumerate(p for p in text.split("\n\n") if p)
+    ]
+
+
+@override_settings(PINECONE_API_KEY="test", OPENAI_API_KEY="test")
+class PineconeEmbeddingTests(TestCase):
+    def setUp(self):
+        self.index = FakeIndex()
+        self.embedded = []
+
+        async def fake_embed(engine, client, texts):
+            self.embedded.extend(texts)
+            return np.ones((len(texts), 4), dtype=np.float32)
+
+        pc = mock.Mock()
+        pc.has_index.return_value = True
+        pc.describe_index.return_value = SimpleNamespace(dimension=1536)
+        for patcher in (
+            mock.patch.dict(pinecone_service._checked_indexes, clear=True),
+            mock.patch.object(pinecone_service, "_get_pinecone", return_value=pc),
+            mock.patch.object(pinecone_service, "_get_index", return_value=self.index),
+            mock.patch.object(pinecone_service, "_use_grpc", return_value=False),
+            mock.patch.object(pinecone_service, "get_openai_client"),
+            mock.patch.object(PineconeEmbedding, "_embed_batch_async", fake_embed),
+            mock.patch.object(
+                PineconeEmbedding, "_chunk", lambda engine, text: paragraph_chunks(text)
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def ingest(self, engine, text, document_id="doc1"):
+        self.embedded.clear()
+        return engine.main(text=text, file_name="a.pdf", file_path=f"db://{document_id}")
+
+    def stored_ids(self, namespace):
+        return set(self.index.namespaces.get(namespace, {}))
+
+    def test_reingest_embeds_only_new_text(self):
+        engine = PineconeEmbedding(namespace="s1")
+        first = self.ingest(engine, "Alpha\n\nBeta")
+        self.assertEqual(first["upserted"], 2)
+        self.assertEqual(sorted(self.embedded), ["Alpha", "Beta"])
+
+        # Beta moves to index 2: its values are reused under the new id and
+        # the old id is dropped; only Gamma is embedded
+        second = self.ingest(engine, "Alpha\n\nGamma\n\nBeta")
+        self.assertEqual(self.embedded, ["Gamma"])
+        self.assertEqual(second["upserted"], 2)
+        expected = {
+            f"doc1:{c['index']}:{c['hash'][:8]}"
+            for c in paragraph_chunks("Alpha\n\nGamma\n\nBeta")
+        }
+        self.assertEqual(self.stored_ids("s1"), expected)
+
+    def test_reingest_of_unchanged_text_embeds_nothing(self):
+        engine = PineconeEmbedding(namespace="s1")
+        self.ingest(engine, "Alpha\n\nBeta")
+        again = self.ingest(engine, "Alpha\n\nBeta")
+        self.assertEqual(again["upserted"], 0)
+        self.assertEqual(self.embedded, [])
+        self.assertEqual(len(self.stored_ids("s1")), 2)
+
+    def test_embeddings_carry_the_tenant_tag(self):
+        engine = PineconeEmbedding(namespace="s1", tenant_id=7)
+        engine.oa.embeddings.create.return_value = SimpleNamespace(
+            data=[SimpleNamespace(embedding=[0.0] * 4)]
+        )
+        engine._embed_batch(["Alpha"])
+        self.assertEqual(engine.oa.embeddings.create.call_args.kwargs["user"], hash_tenant(7))
+
+    def test_copy_document_reuses_vectors_under_new_id(self):
+        self.ingest(PineconeEmbedding(namespace="s1"), "Alpha\n\nBeta")
+        self.embedded.clear()
+
+        copied = PineconeEmbedding(namespace="s2").copy_document(
+            "doc1", "s1", document_id="doc2", file_name="b.pdf", file_path="db://doc2"
+        )
+        self.assertEqual(copied, 2)
+        self.assertEqual(self.embedded, [])
+        stored = self.index.namespaces["s2"]
+        self.assertTrue(all(vid.startswith("doc2:") for vid in stored))
+        for _, metadata in stored.values():
+            self.assertEqual(metadata["document_id"], "doc2")
+            self.assertEqual(metadata["file_name"], "b.pdf")
+        # The source is left untouched
+        self.assertEqual(len(self.stored_ids("s1")), 2)
+
+    def test_copy_document_skips_vectors_of_another_model(self):
+        self.ingest(PineconeEmbedding(namespace="s1"), "Alpha\n\nBeta")
+        for _, metadata in self.index.namespaces["s1"].values():
+            metadata["embedding_model"] = "text-embedding-ada-002"
+
+        copied = PineconeEmbedding(namespace="s2").copy_document(
+            "doc1", "s1", document_id="doc2", file_name="b.pdf", file_path="db://doc2"
+        )
+        self.assertEqual(copied, 0)
+        self.assertEqual(self.stored_ids("s2"), set())
+
+
+class CopyFromTwinTests(TestCase):
+    def setUp(self):
+        self.user = make_user("owner")
+        self.session = ChatSession.objects.create(user=self.user, title="Contracts")
+        self.twin = make_document(
+            self.user, self.session, checksum="abc", status=Document.STATUS_COMPLETED
+        )
+        self.document = make_document(
+            self.user, ChatSession.objects.create(user=self.user), checksum="abc"
+        )
+        self.engine = mock.Mock()
+        self.engine.copy_document.return_value = 2
+
+    def test_copies_vectors_of_completed_upload(self):
+        self.assertTrue(_copy_from_twin(self.document, self.engine))
+        self.engine.copy_document.assert_called_once_with(
+            str(self.twin.pk),
+            self.session.namespace,
+            document_id=str(self.document.id),
+            file_name=self.document.file_name,
+            file_path=f"db://{self.document.id}",
+        )
+
+    def test_ignores_uploads_of_other_users(self):
+        Document.objects.filter(pk=self.twin.pk).update(user=make_user("other"))
+        self.assertFalse(_copy_from_twin(self.document, self.engine))
+        self.engine.copy_document.assert_not_called()
+
+    def test_ignores_uploads_that_are_not_completed(self):
+        Document.objects.filter(pk=self.twin.pk).update(status=Document.STATUS_FAILED)
+        self.assertFalse(_copy_from_twin(self.document, self.engine))
+        self.engine.copy_document.assert_not_called()
+
+    def test_failed_copy_falls_back(self):
+        self.engine.copy_document.side_effect = RuntimeError("pinecone down")
+        self.assertFalse(_copy_from_twin(self.document, self.engine))
+
+    def test_nothing_copied_falls_back(self):
+        self.engine.copy_document.return_value = 0
+        self.assertFalse(_copy_from_twin(self.document, self.engine))
+
+
+class ClaimTests(TestCase):
+    def setUp(self):
+        self.user = make_user("owner")
+
+    def test_claims_pending_document_once(self):
+        document = make_document(self.user)
+        stale = Document.objects.get(pk=document.pk)
+
+        self.assertTrue(_start_processing(document))
+        self.assertEqual(document.status, Document.STATUS_PROCESSING)
+        self.assertEqual(
+            Document.objects.get(pk=document.pk).status, Document.STATUS_PROCESSING
+        )
+        # A second worker holding the old pending row does not claim it again
+        self.assertFalse(_start_processing(stale))
+
+    def test_claims_only_due_documents(self):
+        pending = make_document(self.user, title="a")
+        failed = make_document(
+            self.user, title="b", status=Document.STATUS_FAILED, processing_error="boom"
+        )
+        completed = make_document(self.user, title="c", status=Document.STATUS_COMPLETED)
+
+        claimed = _claim([pending, failed, completed])
+        self.assertEqual(claimed, [pending, failed])
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, Document.STATUS_PROCESSING)
+        self.assertEqual(failed.processing_error, "")
+        completed.refresh_from_db()
+        self.assertEqual(completed.status, Document.STATUS_COMPLETED)
+
+    def test_skips_documents_claimed_elsewhere(self):
+        first = make_document(self.user, title="a")
+        second = make_document(self.user, title="b")
+        Document.objects.filter(pk=second.pk).update(status=Document.STATUS_PROCESSING)
+
+        self.assertEqual(_claim([first, second]), [first])
+
+
+class DocumentListTests(APITestCase):
+    def setUp(self):
+        self.user = make_user("owner")
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        self.documents = []
+        for i in range(3):
+            document = make_document(self.user, title=f"doc{i}")
+            Document.objects.filter(pk=document.pk).update(created_at=now - timedelta(minutes=i))
+            self.documents.append(document)
+        make_document(make_user("other"), title="theirs")
+
+    def test_cursor_pages_list_only_own_documents(self):
+        with mock.patch.object(DocumentListPagination, "page_size", 2):
+            first = self.client.get("/api/documents/")
+            self.assertEqual(first.status_code, 200)
+            self.assertIsNone(first.data["previous"])
+            second = self.client.get(first.data["next"])
+
+        ids = [row["id"] for row in first.data["results"] + second.data["results"]]
+        self.assertEqual(ids, [str(d.id) for d in self.documents])
+        self.assertIsNone(second.data["next"])
+
+    def test_admin_lists_every_document(self):
+        self.client.force_authenticate(make_user("admin", role="admin"))
+        response = self.client.get("/api/documents/")
+        self.assertEqual(len(response.data["results"]), 4)
+
+
+class DocumentETagTests(APITestCase):
+    def setUp(self):
+        self.user = make_user("owner")
+        self.client.force_authenticate(self.user)
+        self.session = ChatSession.objects.create(user=self.user, title="Contracts")
+        self.document = make_document(self.user, self.session)
+
+    def assertRevalidates(self, url, change):
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_document_change_invalidates_list(self):
+        def rename():
+            self.document.title = "Renamed"
+            self.document.save()
+
+        self.assertRevalidates("/api/documents/", rename)
+
+    def test_session_title_change_invalidates_session_views(self):
+        def rename():
+            self.session.title = "Renamed"
+            self.session.save()
+
+        self.assertRevalidates(
+            f"/api/documents/session/{self.session.id}/summaries/", rename
+        )
+
+    def test_each_page_has_its_own_etag(self):
+        make_document(self.user, self.session, title="Older")
+        with mock.patch.object(DocumentListPagination, "page_size", 1):
+            first = self.client.get("/api/documents/")
+            response = self.client.get(first.data["next"], HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+    def test_etag_is_per_user(self):
+        etag = self.client.get("/api/documents/")["ETag"]
+        self.client.force_authenticate(make_user("other"))
+        response = self.client.get("/api/documents/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
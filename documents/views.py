@@ -1,13 +1,19 @@
-import json
-import tempfile
-import os
+import functools
+import hashlib
+import itertools
+import uuid
 from django.db import transaction
+from django.db.models import Count, Max
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from rest_framework import generics, permissions, status
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.views import APIView
-from .models import Document
+from .models import Document, FileAsset
 import logging
 from .serializers import (
     DocumentUploadSerializer,
@@ -16,14 +22,21 @@ from .serializers import (
 )
 from chat.models import ChatSession
 from chat.serializers import ChatSessionSerializer
-from .services.document_processor import extract_text_from_files
-from .services.openai_service import OpenAIService
-from .services.pinecone_service import PineconeService
-from .services.enhanced_pinecone_service import EnhancedPineconeService
-from .services.hybrid_rag_service import HybridRAGService
+from .services.document_pipeline import (
+    generate_risk_factors,
+    generate_summary,
+    process_documents,
+)
 from django.conf import settings
 
 
+def _enqueue_processing(documents, namespace: str, task_ids):
+    from .tasks import process_document_task
+
+    for doc, task_id in zip(documents, task_ids):
+        process_document_task.apply_async((str(doc.id), namespace), task_id=task_id)
+
+
 class DocumentUploadView(generics.CreateAPIView):
     serializer_class = DocumentUploadSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -44,33 +57,76 @@ class DocumentUploadView(generics.CreateAPIView):
                 {"error": "No files provided"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        created_docs = []
-        results = []
-        with transaction.atomic():
-            for f in files:
-                s = self.get_serializer(
-                    data={"file": f, "title": request.data.get("title", "")},
-                    context={"request": request, "session": session},
+        # Hand indexing to Celery workers instead of blocking the request on it
+        process_async = getattr(settings, "PROCESS_DOCUMENTS_ASYNC", False)
+
+        # Validate every file first, then write them all with two bulk INSERTs
+        accepted = []
+        for f in files:
+            s = self.get_serializer(
+                data={"file": f, "title": request.data.get("title", "")},
+                context={"request": request, "session": session},
+            )
+            try:
+                s.is_valid(raise_exception=True)
+            except Exception as e:
+                return Response(
+                    {"error": f"Failed to accept {f.name}: {e}"},
+                    status=status.HTTP_400_BAD_REQUEST,
                 )
-                try:
-                    s.is_valid(raise_exception=True)
-                    doc = s.save()
-                    created_docs.append(doc)
-                    results.append(
-                        {
-                            "file": f.name,
-                            "document_id": str(doc.id),
-                            "status": "accepted",
-                        }
-                    )
-                except Exception as e:
-                    return Response(
-                        {"error": f"Failed to accept {f.name}: {e}"},
-                        status=status.HTTP_400_BAD_REQUEST,
+            accepted.append(s)
+
+        # One live document per (user, session, file_name); check the batch in one query
+        names = [f.name for f in files]
+        taken = set(
+            Document.objects.filter(
+                user=request.user, session=session, file_name__in=names
+            ).values_list("file_name", flat=True)
+        )
+        for name in names:
+            if name in taken:
+                return Response(
+                    {
+                        "error": f"Failed to accept {name}: a document with this "
+                        "name already exists in this session."
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            taken.add(name)
+
+        instances = [s.build_instances() for s in accepted]
+        # Task ids are fixed up front so the response can return them for polling
+        task_ids = [str(uuid.uuid4()) for _ in instances] if process_async else []
+        try:
+            with transaction.atomic():
+                created_docs = Document.objects.bulk_create([doc for doc, _ in instances])
+                FileAsset.objects.bulk_create([asset for _, asset in instances])
+                if process_async:
+                    # Workers must only see documents that were actually committed
+                    transaction.on_commit(
+                        functools.partial(
+                            _enqueue_processing, created_docs, session.namespace, task_ids
+                        )
                     )
+        except Exception as e:
+            return Response(
+                {"error": f"Failed to accept files: {e}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        for doc in created_docs:
-            self._process_document(doc, session.namespace)
+        results = [
+            {
+                "file": doc.file_name,
+                "document_id": str(doc.id),
+                "status": "queued" if process_async else "accepted",
+            }
+            for doc in created_docs
+        ]
+        for result, task_id in zip(results, task_ids):
+            result["task_id"] = task_id
+
+        if not process_async:
+            process_documents(created_docs, session.namespace)
 
         return Response(
             {
@@ -84,120 +140,66 @@ class DocumentUploadView(generics.CreateAPIView):
                 },
                 "results": results,
             },
-            status=status.HTTP_201_CREATED,
+            # Queued documents are stored but not yet indexed
+            status=status.HTTP_202_ACCEPTED if process_async else status.HTTP_201_CREATED,
         )
 
-    def _process_document(self, document: Document, namespace: str):
-        if document.status not in (Document.STATUS_PENDING, Document.STATUS_FAILED):
-            return
-        document.status = Document.STATUS_PROCESSING
-        document.processing_error = ""
-        document.save(update_fields=["status", "processing_error", "updated_at"])
-
-        asset = document.asset
-        tmp_path = None
-        try:
-            fd, tmp_path = tempfile.mkstemp(suffix=f".{document.file_ext}" or "")
-            with os.fdopen(fd, "wb") as tmp:
-                tmp.write(asset.blob)
-
-            # Check if we should use enhanced RAG
-            use_enhanced_rag = getattr(settings, 'USE_ENHANCED_RAG', False)
-
-            if use_enhanced_rag:
-                # Extract text with tables
-                text_with_tables, table_metadata = extract_text_from_files(
-                    [tmp_path],
-                    extract_tables=True
-                )
 
-                # Initialize hybrid RAG service
-                hybrid_service = HybridRAGService()
-                mode_info = hybrid_service.get_processing_mode(text_with_tables)
-
-                print(f"\n{'='*60}")
-                print(f"[HYBRID RAG - {mode_info['mode'].upper()}] Document: {document.file_name}")
-                print(f"  - Text length: {len(text_with_tables):,} chars (~{mode_info['estimated_tokens']:,} tokens)")
-                print(f"  - Has tables: {table_metadata.get('has_tables', False)}")
-                print(f"  - Table count: {table_metadata.get('table_count', 0)}")
-                print(f"  - Processing mode: {mode_info['mode']}")
-                print(f"  - Reason: {mode_info['reason']}")
-
-                if mode_info['mode'] == 'full_context':
-                    # SMALL DOCUMENT: Store full text in DATABASE (persistent across restarts)
-                    print(f"  - Storing full context in database (no embeddings needed)")
-
-                    # Store in database for persistence
-                    document.processing_mode = 'full_context'
-                    document.full_text = text_with_tables
-                    document.save(update_fields=['processing_mode', 'full_text', 'updated_at'])
-
-                    # Also store in cache for fast retrieval (optional performance boost)
-                    hybrid_service.store_full_context(
-                        session_id=str(document.session.id),
-                        document_id=str(document.id),
-                        text=text_with_tables,
-                        metadata=table_metadata
-                    )
 
-                    print(f"  - ✅ Full context stored in DB (persists across server restarts)")
+def documents_etag(get):
+    """
+    Conditional GET for read-mostly document endpoints. The view's
+    get_etag_queryset() names the documents behind the response; the ETag
+    covers their count, their newest updated_at and that of their sessions
+    (session titles are serialized), plus the query string, which selects the
+    page. An unchanged response answers 304 from one aggregate query, before
+    anything is serialized.
+    """
 
-                else:
-                    # LARGE DOCUMENT: Use embeddings as usual
-                    print(f"  - Using embedding-based retrieval")
-
-                    # Mark processing mode
-                    document.processing_mode = 'embeddings'
-                    document.save(update_fields=['processing_mode', 'updated_at'])
-
-                    # Use enhanced Pinecone service with semantic enrichment
-                    service = EnhancedPineconeService(
-                        namespace=namespace,
-                        use_semantic_enrichment=True
-                    )
+    @functools.wraps(get)
+    def wrapper(self, request, *args, **kwargs):
+        stats = self.get_etag_queryset().aggregate(
+            last=Max("updated_at"),
+            session_last=Max("session__updated_at"),
+            total=Count("pk"),
+        )
+        key = (
+            f"{request.user.pk}:{stats['last']}:{stats['session_last']}:{stats['total']}:"
+            f"{request.GET.urlencode()}"
+        )
+        etag = quote_etag(hashlib.blake2b(key.encode(), digest_size=16).hexdigest())
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        response = get(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response["ETag"] = etag
+        return response
 
-                    result = service.store_text_with_semantics(
-                        document_id=str(document.id),
-                        text=text_with_tables,
-                        file_name=document.file_name,
-                        file_path=f"db://{document.id}",
-                        use_llm_enrichment=False
-                    )
+    return wrapper
 
-                    print(f"  - Chunks created: {result.get('chunks_processed', 0)}")
-                    print(f"  - Vectors upserted: {result.get('upserted', 0)}")
-                    print(f"  - Semantic enrichment: {result.get('semantic_enrichment', False)}")
 
-                print(f"{'='*60}\n")
+def _session_documents(request, session_id):
+    """Live documents of one of the user's sessions, for the session ETags."""
+    return Document.objects.filter(session_id=session_id, session__user=request.user)
 
-            else:
-                # OLD: Use original system (backward compatible)
-                text = extract_text_from_files([tmp_path], extract_tables=False)
 
-                print(f"\n[Document Processing - CLASSIC] Document: {document.file_name}")
-                print(f"  - Text length: {len(text)} chars")
+def _wants_refresh(request) -> bool:
+    return str(request.data.get("refresh", "")).lower() in ("1", "true", "yes")
 
-                PineconeService(namespace=namespace).engine.main(
-                    text=text,
-                    file_name=document.file_name,
-                    file_path=f"db://{document.id}",
-                    user=document.user,
-                )
 
-            document.status = Document.STATUS_COMPLETED
-            document.save(update_fields=["status", "updated_at"])
-        except Exception as e:
-            print(f"[Document Processing Error] {str(e)}")
-            document.status = Document.STATUS_FAILED
-            document.processing_error = str(e)
-            document.save(update_fields=["status", "processing_error", "updated_at"])
-            raise
-        finally:
-            if tmp_path and os.path.exists(tmp_path):
-                try:
-                    os.remove(tmp_path)
-                except Exception:
-                    pass
+def _queued_response(request, doc):
+    """202 for generation handed to a worker; the result appears on the detail endpoint."""
+    return Response(
+        {
+            "document_id": str(doc.id),
+            "status": "queued",
+            "status_url": request.build_absolute_uri(
+                reverse("documents:detail", args=[doc.id])
+            ),
+        },
+        status=status.HTTP_202_ACCEPTED,
+    )
 
 
 class DocumentSummaryView(APIView):
@@ -213,34 +215,20 @@ class DocumentSummaryView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Extract on demand from DB bytes (no persistence of raw_text)
-        asset = doc.asset
-        fd, tmp_path = tempfile.mkstemp(suffix=f".{doc.file_ext}" or "")
-        try:
-            with os.fdopen(fd, "wb") as tmp:
-                tmp.write(asset.blob)
-
-            # Use same settings as document upload
-            use_enhanced_rag = getattr(settings, 'USE_ENHANCED_RAG', False)
-            if use_enhanced_rag:
-                text_with_tables, _ = extract_text_from_files([tmp_path], extract_tables=True)
-            else:
-                text_with_tables = extract_text_from_files([tmp_path], extract_tables=False)
-        finally:
-            if os.path.exists(tmp_path):
-                try:
-                    os.remove(tmp_path)
-                except Exception:
-                    pass
-
-        summary, _ = OpenAIService().generate_summary(text_with_tables)
-        doc.summary = summary or ""
-        doc.save(update_fields=["summary", "updated_at"])
+        # A stored summary is returned as is; pass refresh=true to regenerate it
+        if not doc.summary or _wants_refresh(request):
+            if getattr(settings, "PROCESS_DOCUMENTS_ASYNC", False):
+                from .tasks import generate_summary_task
+
+                generate_summary_task.delay(str(doc.id))
+                return _queued_response(request, doc)
+            generate_summary(doc)
+
         return Response(
             {
                 "document_id": str(doc.id),
                 "title": doc.title,
-                "session_id": str(doc.session.id) if doc.session else None,
+                "session_id": str(doc.session_id) if doc.session_id else None,
                 "summary": doc.summary,
             },
             status=status.HTTP_200_OK,
@@ -260,51 +248,55 @@ class RiskFactorsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        asset = doc.asset
-        fd, tmp_path = tempfile.mkstemp(suffix=f".{doc.file_ext}" or "")
-        try:
-            with os.fdopen(fd, "wb") as tmp:
-                tmp.write(asset.blob)
-            text = extract_text_from_files([tmp_path])
-        finally:
-            if os.path.exists(tmp_path):
-                try:
-                    os.remove(tmp_path)
-                except Exception:
-                    pass
-
-        rf_json, _ = OpenAIService().generate_risk_factors(text)
-        try:
-            risk = json.loads(rf_json)
-        except Exception:
-            risk = {"risk_factors": []}
-        doc.risk_factors = risk
-        doc.save(update_fields=["risk_factors", "updated_at"])
+        # Stored risk factors are returned as is; pass refresh=true to regenerate them
+        if not doc.risk_factors or _wants_refresh(request):
+            if getattr(settings, "PROCESS_DOCUMENTS_ASYNC", False):
+                from .tasks import generate_risk_factors_task
+
+                generate_risk_factors_task.delay(str(doc.id))
+                return _queued_response(request, doc)
+            generate_risk_factors(doc)
+
         return Response(
             {
                 "document_id": str(doc.id),
                 "title": doc.title,
-                "session_id": str(doc.session.id) if doc.session else None,
-                "risk_factors": risk,
+                "session_id": str(doc.session_id) if doc.session_id else None,
+                "risk_factors": doc.risk_factors,
             },
             status=status.HTTP_200_OK,
         )
 
 
+class DocumentListPagination(CursorPagination):
+    # Keyset pages ("created_at < last seen") stay as cheap deep into the list
+    # as on page one, unlike OFFSET which scans every skipped row. Responses
+    # carry next/previous cursor links instead of a count and page numbers.
+    ordering = "-created_at"
+    page_size = 50
+
+
 class DocumentListView(generics.ListAPIView):
     serializer_class = DocumentListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = DocumentListPagination
 
     def get_queryset(self):
-        qs = (
-            Document.all_objects
-            if getattr(self.request.user, "role", "user") == "admin"
-            else Document.objects
-        )
-        return qs
+        if getattr(self.request.user, "role", "user") == "admin":
+            qs = Document.all_objects
+        else:
+            # Served newest-first by the doc_live_user_created_idx partial index
+            qs = Document.objects.filter(user=self.request.user)
+        # Only the listed columns; full_text, summary etc. can be large
+        return qs.only(*DocumentListSerializer.Meta.fields)
+
+    def get_etag_queryset(self):
+        return self.get_queryset()
 
+    @documents_etag
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset().order_by("-created_at")
+        # The paginator applies the "-created_at" ordering
+        queryset = self.get_queryset()
         page = self.paginate_queryset(queryset)
         if page is not None:
             ser = self.get_serializer(page, many=True)
@@ -318,7 +310,8 @@ class DocumentDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Document.objects
+        # retrieve() serializes the session too; fetch it in the same query
+        return Document.objects.select_related("session")
 
     def retrieve(self, request, *args, **kwargs):
         doc = self.get_object()
@@ -340,22 +333,55 @@ class DocumentDetailView(generics.RetrieveUpdateDestroyAPIView):
             return super().destroy(request, *args, **kwargs)
 
 
-from django.http import HttpResponse
+from django.db.models import BinaryField
+from django.db.models.functions import Substr
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
 from rest_framework.permissions import IsAuthenticated
 
+# Bytes read from the database per query while streaming a download
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def _blob_chunks(asset_id, size: int):
+    """
+    Yield a stored upload in DOWNLOAD_CHUNK_SIZE slices, each read with its own
+    SUBSTRING query, so the whole file is never held in memory.
+    """
+    for offset in range(0, size, DOWNLOAD_CHUNK_SIZE):
+        chunk = (
+            FileAsset.objects.filter(pk=asset_id)
+            .annotate(
+                part=Substr(
+                    "blob", offset + 1, DOWNLOAD_CHUNK_SIZE, output_field=BinaryField()
+                )
+            )
+            .values_list("part", flat=True)
+            .first()
+        )
+        if not chunk:
+            return
+        yield bytes(chunk)
+
 
 class DocumentDownloadView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, document_id):
-        doc = Document.objects.get(
-            id=document_id, deleted_at__isnull=True
+        # Metadata only; the bytes are streamed by _blob_chunks
+        docs = Document.objects.select_related("asset").only(
+            "id", "file_name", "user_id", "asset__id", "asset__size", "asset__mime_type"
         )
+        if getattr(request.user, "role", "user") != "admin":
+            docs = docs.filter(user=request.user)
+        doc = get_object_or_404(docs, id=document_id, deleted_at__isnull=True)
         asset = doc.asset
-        response = HttpResponse(
-            asset.blob, content_type=asset.mime_type or "application/octet-stream"
+        response = StreamingHttpResponse(
+            _blob_chunks(asset.id, asset.size),
+            content_type=asset.mime_type or "application/octet-stream",
         )
-        response["Content-Disposition"] = f'attachment; filename="{doc.file_name}"'
+        # RFC 6266 filename, also for non-ASCII names
+        response["Content-Disposition"] = content_disposition_header(True, doc.file_name)
         response["Content-Length"] = asset.size
         return response
 
@@ -367,24 +393,41 @@ class SessionDocumentsView(generics.ListAPIView):
     def get_queryset(self):
         session_id = self.kwargs.get("session_id")
         session = get_object_or_404(ChatSession, id=session_id, user=self.request.user)
-        return Document.objects.filter(session=session)
+        return Document.objects.filter(session=session).only(
+            *DocumentListSerializer.Meta.fields
+        )
+
+    def get_etag_queryset(self):
+        return _session_documents(self.request, self.kwargs.get("session_id"))
+
+    @documents_etag
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
 
 class SessionRiskFactorsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_etag_queryset(self):
+        return _session_documents(self.request, self.kwargs.get("session_id"))
+
+    @documents_etag
     def get(self, request, session_id):
         session = get_object_or_404(ChatSession, id=session_id, user=self.request.user)
-        docs = Document.objects.filter(session=session)
-        all_rf = []
-        for d in docs:
-            if d.risk_factors:
-                all_rf.extend(d.risk_factors.get("risk_factors", []))
+        # Only the JSON column is fetched; the document count comes from the same rows
+        risk_factors = list(
+            Document.objects.filter(session=session).values_list("risk_factors", flat=True)
+        )
+        all_rf = list(
+            itertools.chain.from_iterable(
+                (rf or {}).get("risk_factors", []) for rf in risk_factors
+            )
+        )
         return Response(
             {
                 "session_id": str(session.id),
                 "session_title": session.title,
-                "total_documents": docs.count(),
+                "total_documents": len(risk_factors),
                 "total_risk_factors": len(all_rf),
                 "risk_factors": all_rf,
             }
@@ -394,18 +437,22 @@ class SessionRiskFactorsView(APIView):
 class SessionSummariesView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_etag_queryset(self):
+        return _session_documents(self.request, self.kwargs.get("session_id"))
+
+    @documents_etag
     def get(self, request, session_id):
         session = get_object_or_404(ChatSession, id=session_id, user=self.request.user)
-        docs = Document.objects.filter(session=session)
-        summaries = []
-        for d in docs:
-            if d.summary:
-                summaries.append(d.summary)
+        # Only the summary column is fetched; the document count comes from the same rows
+        all_summaries = list(
+            Document.objects.filter(session=session).values_list("summary", flat=True)
+        )
+        summaries = [summary for summary in all_summaries if summary]
         return Response(
             {
                 "session_id": str(session.id),
                 "session_title": session.title,
-                "total_documents": docs.count(),
+                "total_documents": len(all_summaries),
                 "total_summaries": len(summaries),
                 "summaries": summaries,
             }
@@ -16,8 +16,20 @@ django.setup()
 
 from django.conf import settings
 from pinecone import Pinecone
+from documents.services.openai_service import OpenAIService
 from documents.services.pinecone_service import PineconeEmbedding
 
+# Patterns checked against every chunk, compiled once
+CHUNK_PATTERNS = [
+    ('has_amount', re.compile(r'£181,726', re.IGNORECASE)),
+    ('has_section_3', re.compile(r'3\.\d+\s+', re.IGNORECASE)),
+    ('has_payment_clause', re.compile(r'contractor shall pay', re.IGNORECASE)),
+    ('has_subcontract_sum', re.compile(r'subcontract sum', re.IGNORECASE)),
+    ('has_section_header', re.compile(r'3\.0\s+THE SUBCONTRACT SUM', re.IGNORECASE)),
+]
+SECTION_3_RE = re.compile(r'3\.\d+')
+SECTION_3_1_RE = re.compile(r'3\.1\s+The Contractor shall pay', re.IGNORECASE)
+
 
 class PineconeInspector:
     def __init__(self, namespace: str = "default"):
@@ -50,44 +62,34 @@ class PineconeInspector:
     def fetch_all_vectors(self, document_id: str = None, batch_size: int = 100):
         """
         Fetch all vectors from the namespace
-        Since Pinecone doesn't support listing all IDs directly, we'll use query with dummy vector
+        IDs are paged with index.list (no similarity search, no 10k cap) and fetched
+        in batches of batch_size. Vector ids start with "<document_id>:", so a
+        document filter is a prefix listing.
         """
         print(f"\n🔍 Fetching vectors from namespace: '{self.namespace}'")
-        
-        # Get a sample vector to use its dimension
+
         stats = self.index.describe_index_stats()
         ns_stats = stats.get('namespaces', {}).get(self.namespace)
-        
+
         if not ns_stats:
             print(f"❌ Namespace '{self.namespace}' not found!")
             return []
-        
+
         vector_count = ns_stats.get('vector_count', 0)
         print(f"📊 Total vectors in namespace: {vector_count}")
-        
-        # Use similarity search with a dummy query to get all vectors
-        # This is a workaround since Pinecone doesn't have a direct "list all" API
+
         try:
-            # Create a zero vector for dimension-agnostic querying
-            dimension = self.embedding_service.dimension
-            dummy_vector = [0.0] * dimension
-            
-            filter_dict = None
-            if document_id:
-                filter_dict = {"document_id": {"$eq": document_id}}
-            
-            results = self.index.query(
-                namespace=self.namespace,
-                vector=dummy_vector,
-                top_k=min(10000, vector_count),  # Pinecone max is 10000
-                include_metadata=True,
-                filter=filter_dict
-            )
-            
-            matches = results.get('matches', [])
-            print(f"✅ Retrieved {len(matches)} vectors")
-            return matches
-            
+            prefix = f"{document_id}:" if document_id else None
+            vectors = []
+            for ids in self.index.list(prefix=prefix, namespace=self.namespace):
+                ids = list(ids)
+                for i in range(0, len(ids), batch_size):
+                    resp = self.index.fetch(ids=ids[i:i + batch_size], namespace=self.namespace)
+                    vectors.extend(resp.vectors.values())
+
+            print(f"✅ Retrieved {len(vectors)} vectors")
+            return vectors
+
         except Exception as e:
             print(f"❌ Error fetching vectors: {e}")
             return []
@@ -109,9 +111,15 @@ class PineconeInspector:
         
         all_results = {}
         
-        for query in search_queries:
+        # All queries in one embeddings request (split only past the API's
+        # 2048-input / 300k-token per-request limits)
+        query_embeddings, _ = OpenAIService().generate_embeddings_batch(search_queries)
+        
+        for query, query_embedding in zip(search_queries, query_embeddings):
             print(f"\n🔎 Query: '{query}'")
-            results = self.embedding_service.similarity_search(query, top_k=5)
+            results = self.embedding_service.similarity_search(
+                query, top_k=5, query_embedding=query_embedding
+            )
             matches = results.get('matches', []) if isinstance(results, dict) else getattr(results, 'matches', [])
             
             print(f"   Found {len(matches)} matches")
@@ -137,13 +145,14 @@ class PineconeInspector:
         
         return all_results
     
-    def analyze_all_chunks(self, document_id: str = None):
-        """Analyze all chunks to find section 3.1"""
+    def analyze_all_chunks(self, document_id: str = None, vectors=None):
+        """Analyze all chunks to find section 3.1 (pass vectors to reuse a fetch)"""
         print("\n" + "="*80)
         print("ANALYZING ALL CHUNKS FOR SECTION 3.1")
         print("="*80)
         
-        vectors = self.fetch_all_vectors(document_id)
+        if vectors is None:
+            vectors = self.fetch_all_vectors(document_id)
         
         if not vectors:
             print("❌ No vectors found!")
@@ -153,14 +162,6 @@ class PineconeInspector:
         financial_chunks = []
         section_3_chunks = []
         
-        patterns = {
-            'has_amount': r'£181,726',
-            'has_section_3': r'3\.\d+\s+',
-            'has_payment_clause': r'contractor shall pay',
-            'has_subcontract_sum': r'subcontract sum',
-            'has_section_header': r'3\.0\s+THE SUBCONTRACT SUM',
-        }
-        
         print(f"\n🔍 Analyzing {len(vectors)} chunks...\n")
         
         for vector in vectors:
@@ -171,8 +172,8 @@ class PineconeInspector:
             vector_id = vector.get('id', '') if isinstance(vector, dict) else getattr(vector, 'id', '')
             
             matches = {}
-            for pattern_name, pattern in patterns.items():
-                if re.search(pattern, text, re.IGNORECASE):
+            for pattern_name, pattern in CHUNK_PATTERNS:
+                if pattern.search(text):
                     matches[pattern_name] = True
             
             if matches:
@@ -186,7 +187,7 @@ class PineconeInspector:
                 })
             
             # Check if it's section 3.x
-            if re.search(r'3\.\d+', text) or '3.0' in section_label or '3.1' in section_label:
+            if SECTION_3_RE.search(text) or '3.0' in section_label or '3.1' in section_label:
                 section_3_chunks.append({
                     'id': vector_id,
                     'chunk_index': chunk_index,
@@ -222,7 +223,7 @@ class PineconeInspector:
         
         return financial_chunks, section_3_chunks
     
-    def check_section_3_1_exists(self):
+    def check_section_3_1_exists(self, vectors=None):
         """
         Definitive check: Does section 3.1 with the payment amount exist in embeddings?
         """
@@ -230,7 +231,8 @@ class PineconeInspector:
         print("DEFINITIVE CHECK: DOES SECTION 3.1 EXIST?")
         print("="*80)
         
-        vectors = self.fetch_all_vectors()
+        if vectors is None:
+            vectors = self.fetch_all_vectors()
         
         found_section_3_1 = False
         found_amount = False
@@ -241,7 +243,7 @@ class PineconeInspector:
             section_label = metadata.get('section_label', '')
             
             # Check for section 3.1 specifically
-            if re.search(r'3\.1\s+The Contractor shall pay', text, re.IGNORECASE):
+            if SECTION_3_1_RE.search(text):
                 found_section_3_1 = True
                 print("\n✅ FOUND Section 3.1 clause!")
                 print(f"   Section Label: {section_label}")
@@ -272,6 +274,23 @@ class PineconeInspector:
         
         return found_section_3_1, found_amount
 
+    def analyze_all(self, document_id: str = None):
+        """
+        Run the section 3.1 check over the namespace and the chunk analysis over
+        one document from a single vector fetch.
+        """
+        vectors = self.fetch_all_vectors()
+        section_check = self.check_section_3_1_exists(vectors=vectors)
+
+        if document_id:
+            vectors = [v for v in vectors if _metadata(v).get('document_id') == document_id]
+        chunk_analysis = self.analyze_all_chunks(document_id, vectors=vectors)
+        return section_check, chunk_analysis
+
+
+def _metadata(vector) -> dict:
+    return (vector.get('metadata') if isinstance(vector, dict) else getattr(vector, 'metadata', None)) or {}
+
 
 def main():
     """Main execution function"""
@@ -295,14 +314,12 @@ def main():
     print("\n1️⃣  Getting index statistics...")
     inspector.get_index_stats()
 
-    print("\n2️⃣  Checking if Section 3.1 exists...")
-    inspector.check_section_3_1_exists()
-
-    print("\n3️⃣  Searching for Section 3.1 with semantic search...")
+    print("\n2️⃣  Searching for Section 3.1 with semantic search...")
     inspector.search_for_section_3_1()
 
-    print("\n4️⃣  Analyzing all chunks for financial content...")
-    inspector.analyze_all_chunks(document_id=doc_id)
+    # One fetch feeds both the namespace-wide check and the per-document analysis
+    print("\n3️⃣  Checking if Section 3.1 exists and analyzing chunks for financial content...")
+    inspector.analyze_all(document_id=doc_id)
 
     print("\n✅ Inspection complete!")
     print("\n" + "="*80)